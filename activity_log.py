@@ -0,0 +1,394 @@
+import atexit
+import contextlib
+import datetime
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from database import BatchWriter, SQLiteDatabase
+
+# Rotation periods: a new file is started when this strftime() value changes
+ROTATE_PERIODS = {'hourly': '%Y%m%d%H', 'daily': '%Y%m%d', None: None}
+# Record fields with a postings list in the index
+INDEXED_FIELDS = ('action', 'user', 'section')
+# Lines written before the log switched to JSON
+LEGACY_LINE = re.compile(r'^\[(?P<ts>[^\]]*)\] \| user=(?P<user>.*?) \| action=(?P<action>.*?) '
+                         r'\| section=(?P<section>.*?) \| details=(?P<details>.*)$')
+# Bytes read per step when scanning the log backwards from the end
+READ_BLOCK = 64 * 1024
+
+
+def make_record(action, section, details=None, user='unknown', timestamp=None):
+    """Build an activity log record; ts is local time to the second, ISO 8601."""
+    timestamp = timestamp or datetime.datetime.now()
+    return {'ts': timestamp.isoformat(timespec='seconds'), 'user': user, 'action': action,
+            'section': section, 'details': details or ''}
+
+
+def parse_record(line):
+    """Parse one log line (JSON, or the older pipe-delimited text); None if it is neither."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', 'replace')
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        return record if isinstance(record, dict) else None
+    match = LEGACY_LINE.match(line)
+    if not match:
+        return None
+    record = match.groupdict()
+    record['ts'] = record['ts'].replace(' ', 'T')
+    return record
+
+
+class ActivityLogWriter:
+    """Append-only JSONL log file written by a background thread.
+
+    Callers only put records (dicts) on a bounded in-memory queue; the writer
+    thread serializes and drains it in batches, so a burst of requests costs
+    one write() per batch instead of an open/append/close per line. Each
+    batch goes out as a single write() on an O_APPEND descriptor, so batches
+    from several worker processes never interleave within a line. The file
+    stays open between batches and is reopened if another process rotated it
+    away. After each batch the optional ActivityIndex is brought up to date.
+
+    The file is rotated when it grows past ``max_bytes`` or when the
+    ``rotate`` period ('daily', 'hourly' or None) changes. Rotated files are
+    gzip-compressed on a separate thread, so logging does not stall while an
+    archive is compressed, and only the newest ``backups`` archives are kept.
+
+    When the queue is full, ``submit`` applies a backpressure policy chosen
+    per call: 'drop' discards the record at once (for public, spammable
+    events), 'block' waits up to ``block_timeout`` seconds for room before
+    dropping. Dropped records are counted and reported in the log.
+    """
+
+    def __init__(self, path, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 max_bytes=5 * 1024 * 1024, rotate='daily', backups=10, block_timeout=1.0, index=None):
+        self.path = path
+        self.index = index
+        self.max_bytes = max_bytes
+        self.period_format = ROTATE_PERIODS[rotate]
+        self.backups = backups
+        self.block_timeout = block_timeout
+        self._fd = None
+        self._period = None
+        self._compressor = None
+        self._compress_lock = threading.Lock()
+        self._writer = BatchWriter(self._write, 'activity-log', max_queue, batch_size, flush_interval,
+                                   on_close=self._close_file)
+        atexit.register(self.close)
+
+    def submit(self, record, policy='block'):
+        """
+        Queue a record (see make_record) to be appended to the log.
+
+        Returns:
+            bool: False if the record was dropped because the queue was full
+        """
+        return self._writer.put(record, timeout=self.block_timeout if policy == 'block' else None)
+
+    @property
+    def dropped(self):
+        """Records lost to a full queue or a failed write, not yet reported in the log."""
+        return self._writer.dropped
+
+    def flush(self):
+        """Block until every record queued so far has been written."""
+        self._writer.flush()
+
+    def close(self):
+        """Write out the queue and stop the writer thread."""
+        self._writer.close()
+
+    # --- Writer thread ---
+
+    def _write(self, records):
+        dropped = self._writer.take_dropped()
+        if dropped:
+            records = records + [make_record('log_overflow', 'log', f"dropped={dropped}", user='system')]
+        data = ''.join(json.dumps(record) + '\n' for record in records).encode('utf-8')
+        try:
+            self._maybe_rotate()
+            fd = self._open()
+            written = os.write(fd, data)
+            while written < len(data):  # only short on a nearly full disk
+                written += os.write(fd, data[written:])
+        except OSError:
+            self._writer.count_dropped(dropped)  # still unreported; the writer adds this batch
+            raise
+        if self.index is not None:
+            # The lines are written; a locked index catches up on the next batch or query
+            with contextlib.suppress(sqlite3.Error):
+                self.index.catch_up()
+
+    def _close_file(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._compressor:
+            self._compressor.join(timeout=5)
+
+    def _open(self):
+        """Return the log file descriptor, reopening it if the file was rotated or removed."""
+        if self._fd is not None:
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                    return self._fd
+            except OSError:
+                pass
+            os.close(self._fd)
+            self._fd = None
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if self.period_format:
+            self._period = time.strftime(self.period_format, time.localtime(os.fstat(self._fd).st_mtime))
+        return self._fd
+
+    def _maybe_rotate(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if self.period_format and self._period is None:
+            self._open()
+        period_over = self.period_format and size and self._period != time.strftime(self.period_format)
+        if size < self.max_bytes and not period_over:
+            return
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        archive = base = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+        counter = 0
+        while os.path.exists(archive) or os.path.exists(archive + '.gz'):
+            counter += 1
+            archive = f"{base}-{counter}"
+        try:
+            os.replace(self.path, archive)
+        except OSError:
+            return  # another process rotated it first
+        self._compressor = threading.Thread(target=self._compress, args=(archive,),
+                                            name='activity-log-gzip', daemon=True)
+        self._compressor.start()
+
+    def _compress(self, archive):
+        """Gzip a rotated file next to itself, then drop the oldest archives."""
+        with self._compress_lock:
+            try:
+                # Written under a temporary name, so a half-written archive is never pruned as a backup
+                with open(archive, 'rb') as src, gzip.open(archive + '.gz.tmp', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(archive + '.gz.tmp', archive + '.gz')
+                os.remove(archive)
+                self._prune()
+            except OSError:
+                pass  # the uncompressed archive stays behind
+
+    def _prune(self):
+        directory, base = os.path.split(self.path)
+        archives = sorted((os.path.join(directory, name) for name in os.listdir(directory or '.')
+                           if name.startswith(base + '.') and name.endswith('.gz')), key=os.path.getmtime)
+        for path in archives[:-self.backups] if self.backups else archives:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+
+class ActivityIndex:
+    """Sidecar SQLite index over the current activity log file.
+
+    For every line it records the byte offset where the line starts: the
+    first offset of each minute (time buckets) and one posting per indexed
+    field value ('action:login', 'user:admin', ...). Queries look up the
+    offsets of just the entries they return and seek straight to them, so a
+    filtered page costs the same however large the log has grown.
+
+    The index catches up by reading the bytes appended since the last call,
+    which works whichever process wrote them. When the log is rotated (new
+    inode) or truncated, the index starts over for the new file; rotated
+    archives are not indexed.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS state (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        inode INTEGER NOT NULL,
+        indexed_upto INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS buckets (
+        minute TEXT PRIMARY KEY,
+        offset INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS postings (
+        term TEXT NOT NULL,
+        offset INTEGER NOT NULL,
+        PRIMARY KEY (term, offset)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS terms (
+        term TEXT PRIMARY KEY,
+        entries INTEGER NOT NULL
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, log_path, path):
+        self.log_path = log_path
+        self.path = path
+        self.db = SQLiteDatabase(path, self.SCHEMA)
+
+    def _state(self, conn):
+        return conn.execute('SELECT inode, indexed_upto FROM state WHERE id = 0').fetchone() or (None, 0)
+
+    # --- Indexing ---
+
+    def catch_up(self):
+        """Index the complete lines appended to the log since the last call."""
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            with self.db.transaction() as conn:
+                inode, offset = self._state(conn)
+                if inode != stat.st_ino or stat.st_size < offset:
+                    for table in ('buckets', 'postings', 'terms'):
+                        conn.execute(f'DELETE FROM {table}')
+                    offset = 0
+                if stat.st_size > offset:
+                    f.seek(offset)
+                    data = f.read(stat.st_size - offset)
+                    offset = self._index_lines(conn, data[:data.rfind(b'\n') + 1], offset)
+                conn.execute('INSERT OR REPLACE INTO state (id, inode, indexed_upto) VALUES (0, ?, ?)',
+                             (stat.st_ino, offset))
+
+    def _index_lines(self, conn, data, offset):
+        buckets, postings, terms = [], [], Counter()
+        for line in data.splitlines(keepends=True):
+            record = parse_record(line)
+            if record:
+                buckets.append((str(record.get('ts', ''))[:16], offset))
+                for field in INDEXED_FIELDS:
+                    if record.get(field) is not None:
+                        term = f"{field}:{record[field]}"
+                        postings.append((term, offset))
+                        terms[term] += 1
+            offset += len(line)
+        # The first entry of a minute marks where that minute starts
+        conn.executemany('INSERT OR IGNORE INTO buckets (minute, offset) VALUES (?, ?)', buckets)
+        conn.executemany('INSERT OR IGNORE INTO postings (term, offset) VALUES (?, ?)', postings)
+        conn.executemany('INSERT INTO terms (term, entries) VALUES (?, ?) '
+                         'ON CONFLICT (term) DO UPDATE SET entries = entries + excluded.entries', terms.items())
+        return offset
+
+    # --- Queries ---
+
+    def values(self, field):
+        """Indexed values of field with their number of entries, e.g. {'login': 12}."""
+        prefix = f"{field}:"
+        rows = self.db.execute(
+            'SELECT term, entries FROM terms WHERE term >= ? AND term < ? ORDER BY term',
+            (prefix, prefix[:-1] + ';')).fetchall()
+        return {term[len(prefix):]: entries for term, entries in rows}
+
+    def _bucket_offset(self, conn, moment):
+        row = conn.execute('SELECT offset FROM buckets WHERE minute >= ? ORDER BY minute LIMIT 1',
+                           (moment.strftime('%Y-%m-%dT%H:%M'),)).fetchone()
+        return row[0] if row else None
+
+    def query(self, limit=50, before=None, since=None, until=None, **filters):
+        """
+        Return the newest log entries matching the filters, newest first.
+
+        Args:
+            limit (int): Maximum number of entries
+            before (str): Cursor returned with the previous page, or None for the newest
+            since, until (datetime): Only entries in [since, until), to the minute
+            **filters: Field values entries must have, e.g. action='login', user='admin'
+
+        Returns:
+            tuple: (list of record dicts, cursor for the next page or None)
+        """
+        self.catch_up()
+        conn = self.db.connection()
+        inode, upper = self._state(conn)
+        lower = 0
+        position = self.parse_cursor(before, inode)
+        if position is not None:
+            upper = min(upper, position)
+        if since:
+            lower = self._bucket_offset(conn, since)
+            if lower is None:
+                return [], None
+        if until:
+            end = self._bucket_offset(conn, until)
+            upper = upper if end is None else min(upper, end)
+        terms = [f"{field}:{value}" for field, value in filters.items() if value]
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return [], None
+        with f:
+            if os.fstat(f.fileno()).st_ino != inode:
+                return [], None  # rotated since catch_up; the next query sees the new file
+            if terms:
+                entries = [(offset, self._read_at(f, offset))
+                           for offset in self._matching_offsets(conn, terms, lower, upper, limit + 1)]
+            else:
+                entries = self._read_backwards(f, lower, upper, limit + 1)
+        cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            cursor = f"{inode}:{entries[-1][0]}"
+        return [record for _, record in entries if record], cursor
+
+    def _matching_offsets(self, conn, terms, lower, upper, limit):
+        # Walk the first term's postings newest first; every other term is a primary key lookup
+        joins = ''.join(f' JOIN postings p{i} ON p{i}.term = ? AND p{i}.offset = p0.offset'
+                        for i in range(1, len(terms)))
+        rows = conn.execute(
+            f'SELECT p0.offset FROM postings p0{joins} '
+            'WHERE p0.term = ? AND p0.offset >= ? AND p0.offset < ? ORDER BY p0.offset DESC LIMIT ?',
+            terms[1:] + [terms[0], lower, upper, limit]).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _read_at(f, offset):
+        f.seek(offset)
+        return parse_record(f.readline())
+
+    @staticmethod
+    def _read_backwards(f, lower, upper, limit):
+        """Read up to limit entries ending at byte upper, newest first, scanning back from upper."""
+        entries = []
+        position = end = upper
+        tail = b''
+        while position > lower and len(entries) < limit:
+            size = min(READ_BLOCK, position - lower)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + tail).split(b'\n')
+            # The first piece may be the end of a line that starts in an earlier block
+            tail = lines.pop(0) if position > lower else b''
+            for line in reversed(lines):
+                start = end - len(line)
+                if line:
+                    entries.append((start, parse_record(line)))
+                end = start - 1
+        return entries[:limit]
+
+    @staticmethod
+    def parse_cursor(cursor, inode):
+        """Offset from a page cursor; None if missing, malformed or for an older log file."""
+        try:
+            cursor_inode, offset = cursor.split(':')
+            return int(offset) if int(cursor_inode) == inode else None
+        except (AttributeError, ValueError):
+            return None
@@ -1,22 +1,117 @@
-from flask import Flask, render_template, send_from_directory, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, Response, render_template, send_file, send_from_directory, request, redirect, url_for, flash, jsonify, session, abort
 import json
 import os
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, safe_join
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
 import functools
 import uuid
 import copy
 from flask_wtf import CSRFProtect
+from flask_wtf.csrf import generate_csrf
 import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import re
+import hashlib
+import time
+import threading
+import gzip
+import mimetypes
+from storage import encode_document, open_store
+from cache import ByteLRUCache, GzipShell
+from assets import AssetManifest, critical_css_path
+from markupsafe import Markup
+from images import cached_derivatives, generate_derivatives, images_available, locked_manifest, remember_derivatives
+from jobs import JobQueue
+from activity_log import ActivityIndex, ActivityLogWriter, make_record
+from auth import PasswordVerifier, VerifierBusy, make_token_bucket
+from outbox import MailSender, Outbox
+from inbox import Inbox
+from batch import BatchError, apply_operations, describe, validate_operations
+from uploads import MAX_CONTENT_LENGTH, MAX_UPLOAD_SIZE, UploadRequest, sniff_image, store_upload
+
+try:
+    import brotli
+except ImportError:  # optional, responses fall back to gzip
+    brotli = None
 
 UPLOAD_FOLDER = 'static/images'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 JSON_FILE = 'data/data.json'
+# On-disk encoding for JSON_FILE: 'pretty', 'compact' or 'binary' (see storage.FORMATS)
+DATA_FORMAT = os.environ.get('PORTFOLIO_DATA_FORMAT', 'pretty')
+# Storage backend: 'json' keeps everything in JSON_FILE, 'sqlite' stores rows in
+# SQLITE_FILE and uses JSON_FILE only to seed an empty database
+STORAGE_BACKEND = os.environ.get('PORTFOLIO_STORAGE', 'json')
+SQLITE_FILE = 'data/portfolio.db'
+# Activity log: one JSON record per line, with a sidecar index for the admin viewer
 LOG_FILE = 'data/admin_activity.log'
+LOG_INDEX = 'data/admin_activity.index.db'
+LOG_PAGE_SIZE = 50
+# Activity log rotation: size limit, period ('daily', 'hourly' or None) and
+# number of gzip archives kept
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_ROTATE = 'daily'
+LOG_BACKUPS = 10
+# Lines waiting for the log writer thread; when full, public events are dropped
+# and admin events wait briefly for room
+LOG_QUEUE_SIZE = 10000
+PUBLIC_LOG_ACTIONS = {'contact_form', 'failed_login'}
+# Login throttling: token buckets per client IP and per username, kept in
+# memory ('memory') or shared by all workers through THROTTLE_DB ('sqlite')
+THROTTLE_BACKEND = os.environ.get('PORTFOLIO_THROTTLE', 'memory')
+THROTTLE_DB = 'data/throttle.db'
+LOGIN_IP_BURST, LOGIN_IP_PER_MINUTE = 10, 2
+LOGIN_USER_BURST, LOGIN_USER_PER_MINUTE = 5, 1
+# Number of reverse proxies in front of the app (e.g. 1 on Heroku or Render).
+# Their X-Forwarded-For/-Proto headers are trusted, so the client IP used for
+# throttling is the visitor's rather than the proxy's. Leave at 0 when the
+# app is reached directly, or clients could pick their own IP with a header.
+TRUSTED_PROXIES = int(os.environ.get('PORTFOLIO_TRUSTED_PROXIES', 0))
+# Password hashes are checked on this many threads, with at most
+# PASSWORD_CHECKS_PENDING checks running or waiting at once
+PASSWORD_CHECK_WORKERS = 2
+PASSWORD_CHECKS_PENDING = 8
+# Contact form mail: messages are queued in OUTBOX_DB by the request and
+# delivered by a background sender once SMTP_HOST is configured
+OUTBOX_DB = 'data/outbox.db'
+SMTP_HOST = os.environ.get('SMTP_HOST')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+SMTP_SECURITY = os.environ.get('SMTP_SECURITY', 'starttls')  # 'starttls', 'ssl' or 'none'
+SMTP_USERNAME = os.environ.get('SMTP_USERNAME')
+SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
+MAIL_SENDER = os.environ.get('MAIL_SENDER', SMTP_USERNAME)
+# Where contact messages go; defaults to the active portfolio's contact email
+CONTACT_RECIPIENT = os.environ.get('CONTACT_RECIPIENT')
+# Contact form submissions, listed in the admin inbox section
+INBOX_DB = 'data/inbox.db'
+INBOX_PAGE_SIZE = 25
+# A sender repeating a message within this many seconds only bumps its copy
+# count; later repeats show up again as unread
+INBOX_REPEAT_WINDOW = 24 * 60 * 60
+# Render skills, projects, experience etc. into the page on the server instead
+# of leaving them for script.js to fetch and build after load
+SERVER_RENDER_SECTIONS = os.environ.get('PORTFOLIO_SERVER_RENDER', '1') != '0'
+# Upper bound on the memory used by rendered public pages
+PAGE_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Upper bound on the memory used by serialized JSON API responses
+API_CACHE_MAX_BYTES = 4 * 1024 * 1024
+# Server-Sent Events: keep-alive interval and how long one stream stays open
+# before the browser reconnects (EventSource does this automatically)
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_LIFETIME = 300
+# Each open stream holds a worker for EVENT_STREAM_LIFETIME seconds, so streams
+# are off unless PORTFOLIO_EVENT_STREAM=1; enable them only with a threaded or
+# async worker class (e.g. gunicorn -k gthread --threads 32, or -k gevent).
+# Without them pages poll /api/settings every SETTINGS_POLL_INTERVAL seconds.
+EVENT_STREAM_ENABLED = os.environ.get('PORTFOLIO_EVENT_STREAM', '0') == '1'
+SETTINGS_POLL_INTERVAL = 300
+# Background jobs (uploaded image processing) are kept in JOBS_DB, so every
+# worker process sees their status and picks up jobs another one left behind.
+# Jobs of one kind run one at a time in order, so the last upload wins.
+JOBS_DB = 'data/jobs.db'
+IMAGE_JOB_WORKERS = 1
+# File types /data/<filename> may serve; everything else in data/ is private
+DATA_FILE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.svg', '.pdf'}
 
 # --- Experience Category Mapping ---
 EXPERIENCE_CATEGORY_MAP = {
@@ -25,9 +120,17 @@ EXPERIENCE_CATEGORY_MAP = {
     'certification': 'certifications'
 }
 
+# Admin sections that modify data on GET requests
+MUTATING_GET_SECTIONS = {'delete_experience', 'delete_education'}
+
 app = Flask(__name__)
+app.request_class = UploadRequest
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
 app.config['SECRET_KEY'] = 'your_super_secret_key_here' # Replace with a strong secret key
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Requests with a larger declared body are rejected before any of it is read
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
 # --- CSRF Protection ---
 csrf = CSRFProtect(app)
@@ -35,23 +138,29 @@ csrf = CSRFProtect(app)
 
 
 # --- JSON Data Handling Functions ---
+store = open_store(STORAGE_BACKEND, JSON_FILE, SQLITE_FILE, DATA_FORMAT)
+
+def get_portfolio_document():
+    """Return a read-only snapshot of the portfolio document.
+
+    The snapshot is shared with every other request. Build modified views
+    with copies, e.g. ``dict(portfolio, settings=settings)``.
+    """
+    return store.snapshot()
+
 def read_portfolio_data():
-    """Read the portfolio data from the JSON file."""
-    if not os.path.exists(JSON_FILE):
-        return {}
-    with open(JSON_FILE, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    """Read a modifiable copy of the portfolio data from the JSON file."""
+    return store.load_copy()
 
 def write_portfolio_data(data):
     """Write the portfolio data to the JSON file."""
-    with open(JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+    store.write(data)
 
 def initialize_json_data():
     if not os.path.exists('data'):
         os.makedirs('data')
 
-    if not os.path.exists(JSON_FILE) or os.stat(JSON_FILE).st_size == 0:
+    if not get_portfolio_document():
         default_data = {
             "admin_credentials": {
                 "username": "admin",
@@ -214,19 +323,320 @@ def initialize_json_data():
             }
         }
         write_portfolio_data(default_data)
-        print(f"Created default {JSON_FILE} with initial data.")
+        print(f"Created default {store.path} with initial data.")
+
+# --- Rendered Page Cache ---
+# Public portfolio pages only change when an admin saves, so the rendered
+# HTML is cached per (portfolio, content version, settings version, theme,
+# URL). The per-visitor CSRF token is rendered as a placeholder and filled
+# in on every response, so nothing session-specific is ever cached. Pages go
+# out gzipped from a GzipShell cached next to the HTML, which splices the
+# token into the compressed body, so the page is not recompressed per request
+# (brotli streams cannot be spliced like that, so pages are never brotli).
+CSRF_PLACEHOLDER = '__csrf_token_placeholder__'
+page_cache = ByteLRUCache(PAGE_CACHE_MAX_BYTES)
+store.subscribe(lambda changed_store: page_cache.clear())
+
+def render_portfolio_page(portfolio_id, data, index):
+    """
+    Render index.html for a portfolio, reusing cached HTML when possible.
+
+    data must come from the same snapshot as index (see PortfolioIndex.data),
+    otherwise a body could be cached under a version it does not match.
+    """
+    settings = data.get('settings', {})
+    content_version = index.versions.get(portfolio_id, index.document_version)
+    key = (
+        portfolio_id,
+        content_version,
+        index.settings_version,
+        settings.get('default_theme'),
+        request.base_url,
+        SERVER_RENDER_SECTIONS,
+    )
+    csrf = generate_csrf()
+    gzipped = bool(request.accept_encodings['gzip'])
+
+    def build():
+        body = page_cache.get(key)
+        if body is None:
+            body = render_template('index.html', data=data, server_rendered=SERVER_RENDER_SECTIONS,
+                                   csrf_token=lambda: CSRF_PLACEHOLDER).encode('utf-8')
+            page_cache.set(key, body)
+        if not gzipped or len(body) < COMPRESS_MIN_SIZE:
+            return Response(body.replace(CSRF_PLACEHOLDER.encode(), csrf.encode()), mimetype='text/html')
+        shell = page_cache.get(key + ('gzip',))
+        if shell is None:
+            shell = GzipShell(body, CSRF_PLACEHOLDER.encode())
+            page_cache.set(key + ('gzip',), shell)
+        response = Response(shell.render(csrf.encode()), mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    # The page embeds a signed CSRF token, so the validator also covers the
+    # visitor's session secret and rolls over at half the token lifetime;
+    # a 304 can never leave the browser holding an expired token.
+    csrf_secret = hashlib.sha1(session.get('csrf_token', '').encode()).hexdigest()[:8]
+    time_limit = app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    period = int(time.time() // max(time_limit // 2, 1)) if time_limit else 0
+    etag = f"{content_version}-{index.settings_version}-{csrf_secret}-{period}"
+    response = conditional_response(etag, build, weak=True)
+    if response.headers.get('Content-Encoding') == 'gzip':
+        response.set_etag(f"{etag}-gzip", weak=True)
+    response.vary.add('Cookie')
+    response.vary.add('Accept-Encoding')
+    return response
+
+# --- Portfolio JSON API ---
+# Serialized API bodies are cached per (portfolio, content version, settings
+# version, projection), so repeated requests for the same subtrees are served
+# without walking or encoding the portfolio again.
+api_cache = ByteLRUCache(API_CACHE_MAX_BYTES)
+store.subscribe(lambda changed_store: api_cache.clear())
+
+def parse_projection():
+    """Return the sorted subtrees requested with ?sections= or ?fields=, or None.
+
+    Both parameters take comma-separated keys; nested keys use dots, e.g.
+    ``?sections=about,experience.internships``.
+    """
+    raw = ','.join(request.args.getlist('sections') + request.args.getlist('fields'))
+    paths = sorted({path.strip() for path in raw.split(',') if path.strip()})
+    # 'experience' already includes 'experience.thesis'
+    paths = [path for path in paths if not any(path.startswith(other + '.') for other in paths)]
+    return tuple(paths) or None
+
+def project(data, paths):
+    """Copy only the given (dotted) key paths of data into a new dict."""
+    result = {}
+    for path in paths:
+        keys = path.split('.')
+        value = data
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = result
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+    return result
+
+def portfolio_json_response(portfolio_id, data, index):
+    """Serve portfolio data (taken from index's snapshot) as JSON, honouring projections and conditional GETs."""
+    projection = parse_projection()
+    content_version = index.versions.get(portfolio_id, index.document_version)
+    etag = f"{content_version}-{index.settings_version}"
+    if projection:
+        etag += '-' + hashlib.sha1(','.join(projection).encode()).hexdigest()[:8]
+    key = (portfolio_id, content_version, index.settings_version, projection)
+
+    def build():
+        body = api_cache.get(key)
+        if body is None:
+            body = (app.json.dumps(project(data, projection) if projection else data) + '\n').encode('utf-8')
+            api_cache.set(key, body)
+        return Response(body, mimetype='application/json')
+
+    return conditional_response(etag, build)
+
+# --- Conditional GET ---
+def conditional_response(etag, build, weak=False):
+    """Return 304 Not Modified if the client already has ``etag``, else call build().
+
+    Validators are derived from stored content versions, so a matching
+    request is answered without serializing or rendering anything.
+    """
+    last_modified = None
+    if store.modified_at:
+        last_modified = datetime.datetime.fromtimestamp(int(store.modified_at), datetime.timezone.utc)
+    matched = None
+    if request.if_none_match:
+        # Compressed responses carry the same tag with an encoding suffix
+        for candidate in [etag] + [f"{etag}-{encoding}" for encoding in COMPRESSORS]:
+            if request.if_none_match.contains_weak(candidate):
+                matched = candidate
+                break
+    else:
+        since = request.if_modified_since
+        if last_modified and since and since >= last_modified:
+            matched = etag
+    if matched:
+        response = Response(status=304)
+        response.set_etag(matched, weak=weak)
+    else:
+        response = build()
+        response.set_etag(etag, weak=weak)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let browsers keep the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# --- Static Assets ---
+# Templates link to static files through asset_url(), which inserts a content
+# hash into the file name. Fingerprinted URLs change whenever the file does,
+# so they can be cached for a year without revalidation.
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+asset_manifest = AssetManifest(app.static_folder)
+
+@app.template_global()
+def asset_url(filename, **values):
+    """
+    url_for('static', ...) pointing at the fingerprinted copy of a file.
+
+    Also accepts stored /static/... paths (like profile_picture.filepath);
+    other absolute paths and external URLs are returned unchanged.
+    """
+    prefix = app.static_url_path + '/'
+    if filename.startswith(prefix):
+        filename = filename[len(prefix):]
+    elif not filename or filename.startswith('/') or '://' in filename:
+        return filename
+    return url_for('static', filename=asset_manifest.url_path(filename), **values)
+
+@app.template_global()
+def critical_css(page):
+    """Above-the-fold CSS to inline in a page, or '' until build_assets.py has run."""
+    try:
+        with open(critical_css_path(page, app.static_folder), encoding='utf-8') as f:
+            return Markup(f.read())
+    except OSError:
+        return ''
+
+@app.template_global()
+def settings_watch():
+    """How pages follow settings changes: the event stream, or polling every interval seconds."""
+    return {'mode': 'events' if EVENT_STREAM_ENABLED else 'poll', 'interval': SETTINGS_POLL_INTERVAL}
+
+@app.template_global()
+def srcset(sources):
+    """Format image derivatives ({'width', 'filepath'} dicts) as a srcset attribute value."""
+    return ', '.join(f"{asset_url(source['filepath'])} {source['width']}w" for source in sources)
+
+# --- Response Compression ---
+# Dynamic responses are compressed in after_request. Bodies with a strong
+# ETag (the JSON APIs) are compressed once per content version and served
+# from compressed_cache afterwards. Everything else is compressed on every
+# response and never cached; portfolio pages, whose bodies differ per visitor
+# only by the CSRF token, arrive already gzipped (see render_portfolio_page).
+# Static files are served from .br/.gz siblings produced by build_assets.py.
+COMPRESSORS = {}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda body: brotli.compress(body, quality=5)
+COMPRESSORS['gzip'] = lambda body: gzip.compress(body, 6, mtime=0)
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'text/javascript', 'image/svg+xml'}
+COMPRESS_MIN_SIZE = 500
+# Upper bound on the memory used by compressed response bodies
+COMPRESSED_CACHE_MAX_BYTES = 4 * 1024 * 1024
+compressed_cache = ByteLRUCache(COMPRESSED_CACHE_MAX_BYTES)
+store.subscribe(lambda changed_store: compressed_cache.clear())
+
+def negotiate_encoding():
+    """Pick the best content coding the client accepts, or None."""
+    return request.accept_encodings.best_match(list(COMPRESSORS))
+
+@app.before_request
+def serve_static_asset():
+    """
+    Serve fingerprinted and precompressed static files.
+
+    A fingerprinted name (css/main_v3.<hash>.css) is mapped back to its source
+    file and served as immutable, so repeat visits never revalidate it. Either
+    kind of file is served from a .br/.gz sibling when the client accepts it.
+    """
+    if request.endpoint != 'static':
+        return None
+    filename = (request.view_args or {}).get('filename')
+    source = safe_join(app.static_folder, filename) if filename else None
+    if not source:
+        return None
+    fingerprinted = immutable = False
+    if not os.path.isfile(source):
+        resolved = asset_manifest.resolve(filename)
+        if resolved is None:
+            return None
+        # A stale hash (e.g. from a page cached before the file changed) still
+        # gets the current file, just without the immutable caching
+        filename, immutable = resolved
+        source = safe_join(app.static_folder, filename)
+        fingerprinted = True
+    encoding = negotiate_encoding()
+    sibling = source + COMPRESSED_SUFFIXES[encoding] if encoding else None
+    if sibling and (not os.path.isfile(sibling) or os.path.getmtime(sibling) < os.path.getmtime(source)):
+        sibling = None
+    if not sibling and not fingerprinted:
+        return None
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    max_age = STATIC_IMMUTABLE_MAX_AGE if immutable else app.get_send_file_max_age(filename)
+    response = send_file(sibling or source, mimetype=mimetype, conditional=True, max_age=max_age)
+    if sibling:
+        response.headers['Content-Encoding'] = encoding
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress text responses for clients that accept gzip or brotli."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    if not (response.mimetype.startswith('text/') or response.mimetype in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    body = response.get_data()
+    if not encoding or len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        key = (etag, response.mimetype, encoding)
+        compressed = compressed_cache.get(key)
+        if compressed is None:
+            compressed = COMPRESSORS[encoding](body)
+            compressed_cache.set(key, compressed)
+    else:
+        compressed = COMPRESSORS[encoding](body)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
 
 # --- Admin User and Login (Simplified for JSON) ---
 def get_admin_credentials():
     """Get admin credentials from the data file."""
-    data = read_portfolio_data()
+    data = get_portfolio_document()
     return data.get('admin_credentials', {})
 
-def check_admin_password(password):
-    """Check if the provided password matches the stored hash."""
-    credentials = get_admin_credentials()
+# Failed logins are throttled before any hashing, and the hashing itself
+# runs on a small bounded pool so a credential-stuffing burst cannot tie up
+# every request worker
+login_ip_limiter = make_token_bucket(THROTTLE_BACKEND, 'login_ip', LOGIN_IP_BURST,
+                                     LOGIN_IP_PER_MINUTE / 60, THROTTLE_DB)
+login_user_limiter = make_token_bucket(THROTTLE_BACKEND, 'login_user', LOGIN_USER_BURST,
+                                       LOGIN_USER_PER_MINUTE / 60, THROTTLE_DB)
+password_verifier = PasswordVerifier(PASSWORD_CHECK_WORKERS, PASSWORD_CHECKS_PENDING)
+
+def check_admin_password(password, credentials=None):
+    """Check if the provided password matches the stored hash (may raise VerifierBusy)."""
+    if credentials is None:
+        credentials = get_admin_credentials()
     stored_hash = credentials.get('password_hash')
-    return stored_hash and check_password_hash(stored_hash, password)
+    return bool(stored_hash) and password_verifier.verify(stored_hash, password)
+
+@app.errorhandler(VerifierBusy)
+def password_checks_busy(error):
+    """Ask the admin to retry when every password check slot is taken."""
+    flash('The server is busy. Please try again in a moment.', 'danger')
+    return redirect(request.path)
 
 def login_required(view):
     """Decorator to require login for admin routes."""
@@ -239,27 +649,103 @@ def login_required(view):
     return wrapped_view
 
 # --- Helper for file uploads ---
-def allowed_file(filename):
-    """Check if the uploaded file has an allowed extension."""
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Turn an oversized admin upload into a flash message instead of a bare 413."""
+    if session.get('logged_in') and request.path.startswith('/admin'):
+        flash(f'File size must be less than {MAX_UPLOAD_SIZE // (1024 * 1024)}MB.', 'danger')
+        return redirect(request.path)
+    return error
+
+# --- Background Image Processing ---
+image_jobs = JobQueue(JOBS_DB, workers=IMAGE_JOB_WORKERS)
+
+def process_profile_picture(filepath, picture, portfolio_id=None):
+    """
+    Generate derivatives for an uploaded profile picture, then swap it in.
+
+    Runs on the image_jobs pool. The portfolio keeps showing the previous
+    picture until this finishes; if generating derivatives fails, the
+    original upload is swapped in on its own and the job is marked failed.
+    If the portfolio was deleted in the meantime nothing is written and the
+    job fails.
+
+    Args:
+        filepath (str): Where the upload was saved
+        picture (dict): The profile_picture record ({'filename', 'filepath'})
+        portfolio_id (str): Portfolio to update, or None for the top-level data
+
+    Returns:
+        dict: The profile_picture record that was stored
+    """
+    picture = dict(picture)
+    try:
+        # Locked across processes: other workers and convert_images.py update it too
+        with locked_manifest() as manifest:
+            # A re-upload of an image that was already processed maps to the same file
+            record = cached_derivatives(manifest, filepath)
+            if record is None:
+                record = generate_derivatives(filepath)
+                remember_derivatives(manifest, filepath, record)
+        picture.update(record)
+    finally:
+        with store.locked():
+            data = read_portfolio_data()
+            if portfolio_id is None:
+                target = data
+            else:
+                position = find_portfolio_position(data, portfolio_id)
+                if position is None:
+                    raise LookupError(f"Portfolio '{portfolio_id}' no longer exists")
+                target = data['portfolios'][position]
+            target['profile_picture'] = picture
+            write_portfolio_data(data)
+    return picture
+
+image_jobs.register('profile_picture', process_profile_picture)
+
+@app.route('/admin/jobs/<job_id>')
+@login_required
+def admin_job_status(job_id):
+    """Report the status of a background job (polled by admin.js)."""
+    job = image_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
 
 # --- Portfolio Management Functions ---
 def get_active_portfolio():
-    """Get the currently active portfolio."""
-    data = read_portfolio_data()
+    """Get the currently active portfolio (read-only)."""
+    return store.index().active
+
+def get_portfolio_by_id(portfolio_id):
+    """Get a specific portfolio by ID (read-only)."""
+    return store.index().by_id.get(portfolio_id)
+
+def portfolio_name_taken(name):
+    """Check whether a portfolio with this name already exists (case-insensitive)."""
+    return store.index().name_taken(name)
+
+def find_portfolio_position(data, portfolio_id):
+    """Return the list position of a portfolio inside a copy from read_portfolio_data()."""
     portfolios = data.get('portfolios', [])
-    for portfolio in portfolios:
-        if portfolio.get('is_active', False):
-            return portfolio
+    position = store.index().positions.get(portfolio_id)
+    if position is not None and position < len(portfolios) and portfolios[position].get('id') == portfolio_id:
+        return position
+    # The copy no longer lines up with the current snapshot; fall back to a scan
+    for i, portfolio in enumerate(portfolios):
+        if portfolio.get('id') == portfolio_id:
+            return i
     return None
 
-def get_portfolio_by_id(portfolio_id):
-    """Get a specific portfolio by ID."""
-    data = read_portfolio_data()
+def find_active_portfolio(data):
+    """Return the active portfolio inside a copy from read_portfolio_data()."""
     portfolios = data.get('portfolios', [])
+    position = store.index().active_position
+    if position is not None and position < len(portfolios) and portfolios[position].get('is_active'):
+        return portfolios[position]
     for portfolio in portfolios:
-        if portfolio.get('id') == portfolio_id:
+        if portfolio.get('is_active'):
             return portfolio
     return None
 
@@ -327,29 +813,27 @@ def create_portfolio(name, description=""):
 
 def update_portfolio(portfolio_id, updates):
     """Update a portfolio with new data."""
-    data = read_portfolio_data()
-    portfolios = data.get('portfolios', [])
-    
-    for i, portfolio in enumerate(portfolios):
-        if portfolio.get('id') == portfolio_id:
-            portfolio.update(updates)
-            portfolio['updated_at'] = "2024-01-01"  # You might want to use actual datetime
-            data['portfolios'][i] = portfolio
-            write_portfolio_data(data)
-            return True
-    return False
+    with store.locked():
+        data = read_portfolio_data()
+        position = find_portfolio_position(data, portfolio_id)
+        if position is None:
+            return False
+        portfolio = data['portfolios'][position]
+        portfolio.update(updates)
+        portfolio['updated_at'] = "2024-01-01"  # You might want to use actual datetime
+        write_portfolio_data(data)
+        return True
 
 def delete_portfolio(portfolio_id):
     """Delete a portfolio by its ID."""
-    data = read_portfolio_data()
-    portfolios = data.get('portfolios', [])
-    
-    for i, portfolio in enumerate(portfolios):
-        if portfolio.get('id') == portfolio_id:
-            del data['portfolios'][i]
-            write_portfolio_data(data)
-            return True
-    return False
+    with store.locked():
+        data = read_portfolio_data()
+        position = find_portfolio_position(data, portfolio_id)
+        if position is None:
+            return False
+        del data['portfolios'][position]
+        write_portfolio_data(data)
+        return True
 
 def set_active_portfolio(portfolio_id):
     """Set a portfolio as active and deactivate others."""
@@ -389,7 +873,9 @@ def duplicate_portfolio(portfolio_id, new_name):
 # Routes
 @app.route('/')
 def home():
-    data = read_portfolio_data()
+    # Document, portfolio and versions all come from one snapshot
+    index = store.index()
+    data = index.data
     settings = data.get('settings', {})
     is_admin = session.get('logged_in', False)
     
@@ -402,21 +888,26 @@ def home():
         return render_template('access_denied.html'), 403
     
     # Get active portfolio for display
-    active_portfolio = get_active_portfolio()
+    active_portfolio = index.active
     if active_portfolio:
-        # Add settings to active portfolio data
-        active_portfolio['settings'] = settings
-        return render_template('index.html', data=active_portfolio)
+        # Add settings to a shallow copy so the cached document stays untouched
+        return render_portfolio_page(active_portfolio.get('id'), dict(active_portfolio, settings=settings), index)
     else:
-        return render_template('index.html', data=data)
+        return render_portfolio_page(None, data, index)
 
 @app.route('/data/<path:filename>')
 def data_file(filename):
+    # data/ also holds the portfolio document, databases (inbox, outbox,
+    # throttle, activity index) and logs; only media files are public
+    if os.path.splitext(filename)[1].lower() not in DATA_FILE_EXTENSIONS:
+        abort(404)
     return send_from_directory('data', filename)
 
 @app.route('/api/portfolio_data')
 def portfolio_data():
-    data = read_portfolio_data()
+    # Document, portfolio and versions all come from one snapshot
+    index = store.index()
+    data = index.data
     settings = data.get('settings', {})
     is_admin = session.get('logged_in', False)
     
@@ -429,22 +920,115 @@ def portfolio_data():
         return jsonify({'error': 'Public access is disabled'}), 403
     
     # Return active portfolio data with settings
-    active_portfolio = get_active_portfolio()
+    active_portfolio = index.active
     if active_portfolio:
-        # Add settings to the active portfolio data
-        active_portfolio['settings'] = settings
-        return jsonify(active_portfolio)
+        # Add settings to a shallow copy of the active portfolio data
+        return portfolio_json_response(active_portfolio.get('id'), dict(active_portfolio, settings=settings), index)
     else:
-        return jsonify(data)
+        return portfolio_json_response(None, data, index)
+
+def settings_payload(index):
+    """Build the small settings/version document served to polling clients."""
+    return {
+        'settings': index.settings,
+        'version': index.document_version,
+        'settings_version': index.settings_version,
+    }
+
+@app.route('/api/settings')
+def portfolio_settings():
+    """Settings plus content versions, without any portfolio content."""
+    index = store.index()
+    settings = index.settings
+    is_admin = session.get('logged_in', False)
+
+    # Check maintenance mode first
+    if settings.get('maintenance_mode') and not is_admin:
+        return jsonify({'error': 'Site is under maintenance'}), 503
+
+    # Check public access
+    if not settings.get('allow_public_access', True) and not is_admin:
+        return jsonify({'error': 'Public access is disabled'}), 403
+
+    return conditional_response(index.document_version, lambda: jsonify(settings_payload(index)))
+
+# --- Change Notifications ---
+# Woken whenever this process loads a new snapshot (its own writes, or
+# another worker's write noticed by any request). Streams also re-check the
+# store on every heartbeat, so writes from other workers reach idle streams
+# within EVENT_STREAM_HEARTBEAT seconds.
+store_changed = threading.Condition()
+
+def _notify_store_changed(changed_store):
+    with store_changed:
+        store_changed.notify_all()
+
+store.subscribe(_notify_store_changed)
+
+@app.route('/api/events')
+def portfolio_events():
+    """Server-Sent Events stream announcing settings and content changes."""
+    if not EVENT_STREAM_ENABLED:
+        return jsonify({'error': 'Event stream is disabled'}), 404
+    settings = store.index().settings
+    is_admin = session.get('logged_in', False)
+
+    # Check maintenance mode first
+    if settings.get('maintenance_mode') and not is_admin:
+        return jsonify({'error': 'Site is under maintenance'}), 503
+
+    # Check public access
+    if not settings.get('allow_public_access', True) and not is_admin:
+        return jsonify({'error': 'Public access is disabled'}), 403
+
+    def stream():
+        last_version = store.index().document_version
+        deadline = time.monotonic() + EVENT_STREAM_LIFETIME
+        yield 'retry: 5000\n\n'
+        while time.monotonic() < deadline:
+            with store_changed:
+                store_changed.wait(EVENT_STREAM_HEARTBEAT)
+            index = store.index()
+            if index.document_version != last_version:
+                last_version = index.document_version
+                yield f"event: change\ndata: {json.dumps(settings_payload(index))}\n\n"
+            else:
+                yield ': keep-alive\n\n'
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        # Spend a token for the client and for the username before doing any work.
+        # An exhausted username only blocks clients that have been failing
+        # themselves: otherwise anyone could keep the admin locked out just by
+        # guessing at their username. The price is that a guesser spread over
+        # many IPs gets one attempt per fresh IP while the username is locked.
+        client = request.remote_addr or 'unknown'
+        fresh_client = login_ip_limiter.level(client) >= LOGIN_IP_BURST
+        wait = login_ip_limiter.consume(client)
+        if not wait:
+            user_wait = login_user_limiter.consume(username.casefold())
+            if not fresh_client:
+                wait = user_wait
+        if wait:
+            log_admin_activity('failed_login', 'auth', f"username={username}, throttled")
+            flash(f'Too many login attempts. Please try again in {int(wait) + 1} seconds.', 'danger')
+            return render_template('login.html'), 429, {'Retry-After': str(int(wait) + 1)}
         credentials = get_admin_credentials()
         ADMIN_USERNAME = credentials.get('username')
-        if username == ADMIN_USERNAME and check_admin_password(password):
+        try:
+            valid = username == ADMIN_USERNAME and check_admin_password(password, credentials)
+        except VerifierBusy:
+            flash('The server is busy. Please try again in a moment.', 'danger')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
+        if valid:
+            login_ip_limiter.reset(client)
+            login_user_limiter.reset(username.casefold())
             session['logged_in'] = True
             session['admin_username'] = username
             log_admin_activity('login', 'auth', f"username={username}")
@@ -468,6 +1052,14 @@ def logout():
 @app.route('/admin/<section>', methods=['GET', 'POST'])
 @login_required
 def admin_dashboard(section):
+    # Hold the single-writer lock across the whole read-modify-write cycle so
+    # concurrent admin requests in other workers cannot overwrite each other.
+    if request.method == 'POST' or section in MUTATING_GET_SECTIONS:
+        with store.locked():
+            return _admin_dashboard(section)
+    return _admin_dashboard(section)
+
+def _admin_dashboard(section):
     data = read_portfolio_data()
     context = {'current_section': section, 'data': data}
 
@@ -490,7 +1082,8 @@ def admin_dashboard(section):
                           len(active_portfolio.get('experience', {}).get('thesis', [])) + 
                           len(active_portfolio.get('experience', {}).get('certifications', [])),
             'education': len(active_portfolio.get('experience', {}).get('education', [])),
-            'active_portfolio_name': active_portfolio.get('name', 'None')
+            'active_portfolio_name': active_portfolio.get('name', 'None'),
+            'unread_messages': inbox.unread_count()
         }
         context['stats'] = stats
         return render_template('admin_dashboard.html', **context)
@@ -498,18 +1091,12 @@ def admin_dashboard(section):
     # --- SKILLS ---
     elif section == 'skills':
         # Patch: update skills in active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         skills_data = (active_portfolio['skills'] if active_portfolio and 'skills' in active_portfolio else data['skills'])
         context['skills'] = []
         for skill_type in ['technical', 'soft']:
             for idx, skill in enumerate(skills_data[skill_type]):
-                skill['id'] = f"{skill_type}_{idx}"
-                skill['type'] = skill_type
-                context['skills'].append(skill)
+                context['skills'].append(dict(skill, id=f"{skill_type}_{idx}", type=skill_type))
         # Handle drag-and-drop reorder
         if request.method == 'POST':
             if request.is_json:
@@ -520,9 +1107,7 @@ def admin_dashboard(section):
                     all_skills = []
                     for skill_type in ['technical', 'soft']:
                         for idx, skill in enumerate(skills_data[skill_type]):
-                            skill['id'] = f"{skill_type}_{idx}"
-                            skill['type'] = skill_type
-                            all_skills.append(skill)
+                            all_skills.append(dict(skill, id=f"{skill_type}_{idx}", type=skill_type))
                     id_to_skill = {s['id']: s for s in all_skills}
                     reordered = [id_to_skill[skill_id] for skill_id in new_order if skill_id in id_to_skill]
                     # Split back into technical and soft
@@ -548,11 +1133,7 @@ def admin_dashboard(section):
         context['form_title'] = 'Add New Skill'
         if request.method == 'POST':
             # Patch: add skill to active portfolio
-            active_portfolio = None
-            for portfolio in data.get('portfolios', []):
-                if portfolio.get('is_active'):
-                    active_portfolio = portfolio
-                    break
+            active_portfolio = find_active_portfolio(data)
             skills_data = (active_portfolio['skills'] if active_portfolio and 'skills' in active_portfolio else data['skills'])
             skill_type = request.form['type']
             name = request.form['name']
@@ -568,23 +1149,14 @@ def admin_dashboard(section):
         skill_id = request.args.get('id')
         if skill_id:
             # Patch: get skill from active portfolio
-            active_portfolio = None
-            for portfolio in data.get('portfolios', []):
-                if portfolio.get('is_active'):
-                    active_portfolio = portfolio
-                    break
+            active_portfolio = find_active_portfolio(data)
             skills_data = (active_portfolio['skills'] if active_portfolio and 'skills' in active_portfolio else data['skills'])
             skill_type, idx = skill_id.split('_')
             idx = int(idx)
-            context['skill'] = skills_data[skill_type][idx]
-            context['skill']['type'] = skill_type
+            context['skill'] = dict(skills_data[skill_type][idx], type=skill_type)
         if request.method == 'POST':
             # Patch: update skill in active portfolio
-            active_portfolio = None
-            for portfolio in data.get('portfolios', []):
-                if portfolio.get('is_active'):
-                    active_portfolio = portfolio
-                    break
+            active_portfolio = find_active_portfolio(data)
             skills_data = (active_portfolio['skills'] if active_portfolio and 'skills' in active_portfolio else data['skills'])
             skill_type = request.form['type']
             name = request.form['name']
@@ -598,16 +1170,11 @@ def admin_dashboard(section):
     # --- PROJECTS ---
     elif section == 'projects':
         # Patch: update projects in active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         projects_data = (active_portfolio['projects'] if active_portfolio and 'projects' in active_portfolio else data['projects'])
         context['projects'] = []
         for idx, project in enumerate(projects_data):
-            project['id'] = idx
-            context['projects'].append(project)
+            context['projects'].append(dict(project, id=idx))
         if request.method == 'POST':
             if request.is_json:
                 req = request.get_json()
@@ -632,11 +1199,7 @@ def admin_dashboard(section):
         context['form_title'] = 'Add New Project'
         if request.method == 'POST':
             # Patch: add project to active portfolio
-            active_portfolio = None
-            for portfolio in data.get('portfolios', []):
-                if portfolio.get('is_active'):
-                    active_portfolio = portfolio
-                    break
+            active_portfolio = find_active_portfolio(data)
             projects_data = (active_portfolio['projects'] if active_portfolio and 'projects' in active_portfolio else data['projects'])
             title = request.form['title']
             description = request.form['description']
@@ -652,11 +1215,7 @@ def admin_dashboard(section):
         context['form_title'] = 'Edit Project'
         idx = int(request.args.get('id', 0))
         # Patch: get project from active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         projects_data = (active_portfolio['projects'] if active_portfolio and 'projects' in active_portfolio else data['projects'])
         context['project'] = projects_data[idx]
         if request.method == 'POST':
@@ -674,11 +1233,7 @@ def admin_dashboard(section):
     # --- EXPERIENCE ---
     elif section == 'experience':
         # Patch: update experience in active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
         context['experience_data'] = experience_data
         # Deletion handled in delete_experience
@@ -689,11 +1244,7 @@ def admin_dashboard(section):
         context['category'] = category
         if request.method == 'POST':
             # Patch: add experience to active portfolio
-            active_portfolio = None
-            for portfolio in data.get('portfolios', []):
-                if portfolio.get('is_active'):
-                    active_portfolio = portfolio
-                    break
+            active_portfolio = find_active_portfolio(data)
             experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
             item = {'title': request.form['title'], 'description': request.form.get('description', '')}
             if category == 'internship':
@@ -718,11 +1269,7 @@ def admin_dashboard(section):
         idx = int(request.args.get('id', 0))
         context['category'] = category
         # Patch: get experience from active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
         context['experience'] = experience_data[EXPERIENCE_CATEGORY_MAP[category]][idx]
         if request.method == 'POST':
@@ -748,11 +1295,7 @@ def admin_dashboard(section):
         category = request.args.get('category')
         idx = int(request.args.get('id', 0))
         # Patch: delete experience from active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
         log_admin_activity('delete', category, f"idx={idx}")
         del experience_data[EXPERIENCE_CATEGORY_MAP[category]][idx]
@@ -763,11 +1306,7 @@ def admin_dashboard(section):
     # --- EDUCATION ---
     elif section == 'education':
         # Patch: update education in active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
         context['education_data'] = experience_data.get('education', [])
 
@@ -775,11 +1314,7 @@ def admin_dashboard(section):
         context['form_title'] = 'Add New Education'
         if request.method == 'POST':
             # Patch: add education to active portfolio
-            active_portfolio = None
-            for portfolio in data.get('portfolios', []):
-                if portfolio.get('is_active'):
-                    active_portfolio = portfolio
-                    break
+            active_portfolio = find_active_portfolio(data)
             experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
             item = {
                 'degree': request.form['degree'],
@@ -802,11 +1337,7 @@ def admin_dashboard(section):
         context['form_title'] = 'Edit Education'
         idx = int(request.args.get('id', 0))
         # Patch: get education from active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
         context['education'] = experience_data.get('education', [])[idx]
         if request.method == 'POST':
@@ -829,11 +1360,7 @@ def admin_dashboard(section):
     elif section == 'delete_education':
         idx = int(request.args.get('id', 0))
         # Patch: delete education from active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         experience_data = (active_portfolio['experience'] if active_portfolio and 'experience' in active_portfolio else data['experience'])
         log_admin_activity('delete', 'education', f"idx={idx}")
         del experience_data['education'][idx]
@@ -844,11 +1371,7 @@ def admin_dashboard(section):
     # --- CONTACT ---
     elif section == 'contact':
         # Patch: update contact info in active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         
         # Get contact settings from active portfolio or fallback to root data
         if active_portfolio and 'contact' in active_portfolio:
@@ -895,42 +1418,94 @@ def admin_dashboard(section):
             flash('Contact settings updated successfully! These changes will appear on the hero page.', 'success')
             return redirect(url_for('admin_dashboard', section='contact'))
 
+    # --- INBOX ---
+    elif section == 'inbox':
+        if request.method == 'POST':
+            action = request.form.get('action')
+            ids = [int(i) for i in request.form.getlist('ids') if i.isdigit()]
+            if ids and action in ('read', 'unread'):
+                inbox.mark_read(ids, read=action == 'read')
+                flash(f"Marked {len(ids)} message(s) as {action}.", 'success')
+            elif ids and action == 'delete':
+                inbox.delete(ids)
+                log_admin_activity('delete', 'inbox', f"count={len(ids)}")
+                flash(f"Deleted {len(ids)} message(s).", 'success')
+            else:
+                flash('Select at least one message.', 'warning')
+            # Back to the same page and filters
+            view_args = {key: value for key, value in request.args.items() if key != 'section'}
+            return redirect(url_for('admin_dashboard', section='inbox', **view_args))
+        inbox_filter = {
+            'unread': request.args.get('filter') == 'unread',
+            'email': request.args.get('email', '').strip(),
+        }
+        messages, next_cursor = inbox.page(INBOX_PAGE_SIZE, before=request.args.get('before'),
+                                           unread_only=inbox_filter['unread'], email=inbox_filter['email'])
+        for message in messages:
+            message['received'] = datetime.datetime.fromtimestamp(message['received_at']).strftime('%Y-%m-%d %H:%M')
+        context['inbox_messages'] = messages
+        context['inbox_next'] = next_cursor
+        context['inbox_filter'] = inbox_filter
+        context['inbox_unread'] = inbox.unread_count()
+
+    # --- ACTIVITY LOG ---
+    elif section == 'activity':
+        activity_filter = {field: request.args.get(field, '') for field in ('action', 'user', 'since', 'until')}
+        try:
+            since = datetime.datetime.strptime(activity_filter['since'], '%Y-%m-%d') if activity_filter['since'] else None
+            until = datetime.datetime.strptime(activity_filter['until'], '%Y-%m-%d') if activity_filter['until'] else None
+        except ValueError:
+            flash('Dates must be in YYYY-MM-DD format.', 'warning')
+            since = until = None
+        if until:
+            until += datetime.timedelta(days=1)  # include the whole "until" day
+        entries, next_cursor = activity_index.query(LOG_PAGE_SIZE, before=request.args.get('before'),
+                                                    since=since, until=until,
+                                                    action=activity_filter['action'], user=activity_filter['user'])
+        context['activity_entries'] = entries
+        context['activity_next'] = next_cursor
+        context['activity_filter'] = activity_filter
+        context['activity_actions'] = activity_index.values('action')
+        context['activity_users'] = activity_index.values('user')
+
     # --- ABOUT ---
     elif section == 'about':
         # Patch: update about info in active portfolio
-        active_portfolio = None
-        for portfolio in data.get('portfolios', []):
-            if portfolio.get('is_active'):
-                active_portfolio = portfolio
-                break
+        active_portfolio = find_active_portfolio(data)
         context['about_settings'] = (active_portfolio['about'] if active_portfolio and 'about' in active_portfolio else data['about'])
+        context['profile_picture_job'] = image_jobs.get(session.get('profile_picture_job', ''))
         if request.method == 'POST':
             if 'profile_pic' in request.files:
                 file = request.files['profile_pic']
-                if file and allowed_file(file.filename):
-                    if file.mimetype not in ['image/jpeg', 'image/png', 'image/gif', 'image/jpg']:
-                        flash('Only JPG, PNG, or GIF images are allowed.', 'danger')
-                        return redirect(url_for('admin_dashboard', section='about'))
-                    file.seek(0, os.SEEK_END)
-                    if file.tell() > 2 * 1024 * 1024:
-                        flash('File size must be less than 2MB.', 'danger')
+                # The body was streamed to an UploadSpool while the form was parsed, with
+                # the size cap enforced per chunk (see uploads.py)
+                extension = sniff_image(file.stream.head) if file else None
+                if extension:
+                    stored_name, created = store_upload(file.stream, app.config['UPLOAD_FOLDER'], extension)
+                    filename = secure_filename(file.filename) or stored_name
+                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], stored_name)
+                    picture = {'filename': filename, 'filepath': f'/static/images/{stored_name}'}
+                    if images_available():
+                        # Resized AVIF/WebP/JPEG copies for the <picture> srcset are generated in
+                        # the background; the picture is swapped in once they are ready
+                        job_id = image_jobs.submit('profile_picture', filepath, picture,
+                                                   active_portfolio['id'] if active_portfolio else None)
+                        session['profile_picture_job'] = job_id
+                        log_admin_activity('update', 'profile_picture', f"filename={filename}, stored={stored_name}, duplicate={not created}, job={job_id}")
+                        flash('Profile picture uploaded! It will appear once processing finishes.', 'success')
                         return redirect(url_for('admin_dashboard', section='about'))
-                    file.seek(0)
-                    filename = secure_filename(file.filename)
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
                     
                     # Update profile picture in active portfolio
                     if active_portfolio:
-                        active_portfolio['profile_picture'] = {'filename': filename, 'filepath': f'/static/images/{filename}'}
+                        active_portfolio['profile_picture'] = picture
                     else:
-                        data['profile_picture'] = {'filename': filename, 'filepath': f'/static/images/{filename}'}
+                        data['profile_picture'] = picture
                     
                     write_portfolio_data(data)
-                    log_admin_activity('update', 'profile_picture', f"filename={filename}")
+                    log_admin_activity('update', 'profile_picture', f"filename={filename}, stored={stored_name}, duplicate={not created}")
                     flash('Profile picture updated successfully!', 'success')
                 else:
-                    flash('Invalid file type.', 'danger')
+                    flash('Only JPG, PNG, or GIF images are allowed.', 'danger')
                 return redirect(url_for('admin_dashboard', section='about'))
 
             if request.form.get('action') == 'add_hero_button':
@@ -1131,7 +1706,7 @@ def admin_dashboard(section):
                 description = request.form.get('description', '').strip()
                 if name:
                     # Check for unique name
-                    if any(p['name'].lower() == name.lower() for p in data.get('portfolios', [])):
+                    if portfolio_name_taken(name):
                         flash('A portfolio with this name already exists. Please choose a unique name.', 'danger')
                     else:
                         create_portfolio(name, description)
@@ -1170,7 +1745,7 @@ def admin_dashboard(section):
                 new_name = request.form.get('new_name', '').strip()
                 if portfolio_id and new_name:
                     # Check for unique name
-                    if any(p['name'].lower() == new_name.lower() for p in data.get('portfolios', [])):
+                    if portfolio_name_taken(new_name):
                         flash('A portfolio with this name already exists. Please choose a unique name.', 'danger')
                     else:
                         if duplicate_portfolio(portfolio_id, new_name):
@@ -1185,16 +1760,71 @@ def admin_dashboard(section):
     return render_template('admin_dashboard.html', **context)
 
 
+# --- Batch Admin API ---
+@app.route('/admin/api/batch', methods=['POST'])
+@login_required
+def admin_batch():
+    """
+    Apply a list of edits to one portfolio in a single write.
+
+    The body is {"portfolio_id": ..., "ops": [...]} (the active portfolio when
+    portfolio_id is omitted). Each op is {"op": "add"|"edit"|"delete"|"reorder",
+    "target": "skills"|"projects"|"experience"|"education"|"hero_buttons"|"contact", ...}
+    with "index", "order", "item" and the list selector ("type" for skills,
+    "category" for experience) as needed; "edit" only changes the fields given.
+    See batch.py for the exact fields.
+
+    Every op is checked before anything is applied, and ops run in order on a
+    copy of the data, so either all of them are saved or none are.
+
+    Returns:
+        JSON with 'success' and one result per op, or the errors (400/404/409)
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({'success': False, 'message': 'Expected a JSON object'}), 400
+    ops = payload.get('ops')
+    errors = validate_operations(ops)
+    if errors:
+        return jsonify({'success': False, 'message': 'Invalid operations', 'errors': errors}), 400
+
+    with store.locked():
+        data = read_portfolio_data()
+        portfolio_id = payload.get('portfolio_id')
+        if portfolio_id:
+            position = find_portfolio_position(data, portfolio_id)
+            portfolio = data['portfolios'][position] if position is not None else None
+        else:
+            portfolio = find_active_portfolio(data)
+        if portfolio is None:
+            return jsonify({'success': False, 'message': 'Portfolio not found'}), 404
+        try:
+            results = apply_operations(portfolio, ops)
+        except BatchError as e:
+            # Nothing was written; the copy with the partial batch is discarded
+            return jsonify({'success': False, 'message': 'Batch not applied',
+                            'errors': [{'index': e.index, 'error': e.message}]}), 409
+        write_portfolio_data(data)
+
+    # The writer thread appends these in one batch
+    for op in ops:
+        log_admin_activity(op['op'], op['target'], describe(op))
+    return jsonify({'success': True, 'portfolio_id': portfolio['id'], 'results': results})
+
+
 @app.route('/export_data')
 def export_data():
-    data = read_portfolio_data()
-    # For a JSON-based system, the data is already in JSON format.
-    # We can just serve the existing JSON_FILE.
-    return send_from_directory(os.path.dirname(JSON_FILE), os.path.basename(JSON_FILE), as_attachment=True, download_name="portfolio_data.json")
+    # The file on disk may be stored compact or binary; always export
+    # readable JSON so it can be imported anywhere.
+    body = encode_document(get_portfolio_document(), 'pretty')
+    return Response(body, mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=portfolio_data.json'})
 
 @app.route('/portfolio/<portfolio_id>')
 def view_portfolio(portfolio_id):
-    data = read_portfolio_data()
+    # Document, portfolio and versions all come from one snapshot
+    index = store.index()
+    data = index.data
     settings = data.get('settings', {})
     is_admin = session.get('logged_in', False)
     
@@ -1206,11 +1836,10 @@ def view_portfolio(portfolio_id):
     if not settings.get('allow_public_access', True) and not is_admin:
         return render_template('access_denied.html'), 403
     
-    portfolio = get_portfolio_by_id(portfolio_id)
+    portfolio = index.by_id.get(portfolio_id)
     if portfolio:
-        # Add settings to portfolio data
-        portfolio['settings'] = settings
-        return render_template('index.html', data=portfolio)
+        # Add settings to a shallow copy of the portfolio data
+        return render_portfolio_page(portfolio_id, dict(portfolio, settings=settings), index)
     else:
         flash('Portfolio not found.', 'danger')
         return redirect(url_for('home'))
@@ -1218,7 +1847,9 @@ def view_portfolio(portfolio_id):
 @app.route('/portfolio/<portfolio_id>/api')
 def portfolio_data_api(portfolio_id):
     """API endpoint to get portfolio data"""
-    data = read_portfolio_data()
+    # Document, portfolio and versions all come from one snapshot
+    index = store.index()
+    data = index.data
     settings = data.get('settings', {})
     is_admin = session.get('logged_in', False)
     
@@ -1230,16 +1861,28 @@ def portfolio_data_api(portfolio_id):
     if not settings.get('allow_public_access', True) and not is_admin:
         return jsonify({'error': 'Public access is disabled'}), 403
     
-    portfolio = get_portfolio_by_id(portfolio_id)
+    portfolio = index.by_id.get(portfolio_id)
     if portfolio:
-        # Add settings to the portfolio data
-        portfolio['settings'] = settings
-        return jsonify(portfolio)
+        # Add settings to a shallow copy of the portfolio data
+        return portfolio_json_response(portfolio_id, dict(portfolio, settings=settings), index)
     else:
         return jsonify({'error': 'Portfolio not found'}), 404
 
 
 
+# --- Contact Form Mail ---
+inbox = Inbox(INBOX_DB, repeat_window=INBOX_REPEAT_WINDOW)
+outbox = Outbox(OUTBOX_DB)
+mail_sender = MailSender(outbox, SMTP_HOST, SMTP_PORT, SMTP_SECURITY, SMTP_USERNAME, SMTP_PASSWORD,
+                         sender=MAIL_SENDER)
+
+def contact_recipient():
+    """Address contact messages are delivered to."""
+    if CONTACT_RECIPIENT:
+        return CONTACT_RECIPIENT
+    portfolio = get_active_portfolio() or get_portfolio_document()
+    return (portfolio.get('contact') or {}).get('email')
+
 @app.route('/contact', methods=['POST'])
 def contact_form():
     """Handle contact form submissions"""
@@ -1248,10 +1891,10 @@ def contact_form():
         if not request.form.get('csrf_token'):
             return jsonify({'success': False, 'message': 'Invalid request'}), 400
         
-        # Get form data
-        name = request.form.get('name', '').strip()
+        # Get form data; name and subject end up in mail headers, so no line breaks
+        name = ' '.join(request.form.get('name', '').split())
         email = request.form.get('email', '').strip()
-        subject = request.form.get('subject', '').strip()
+        subject = ' '.join(request.form.get('subject', '').split())
         message = request.form.get('message', '').strip()
         
         # Validation
@@ -1264,11 +1907,20 @@ def contact_form():
         if not message or len(message) < 10 or len(message) > 1000:
             return jsonify({'success': False, 'message': 'Message must be between 10 and 1000 characters'}), 400
         
+        # Stored by the inbox writer thread in batches; see inbox.Inbox
+        inbox.submit(name, email, subject, message)
+
+        # Queue the message for the background mail sender; delivery never blocks the request
+        recipient = contact_recipient()
+        if recipient:
+            outbox.enqueue(recipient, f"Portfolio contact: {subject or 'New message'} (from {name})",
+                           f"Name: {name}\nEmail: {email}\nSubject: {subject}\n\n{message}",
+                           reply_to=email, reply_name=name)
+            mail_sender.wake()
+        
         # Log the contact form submission
         log_admin_activity('contact_form', 'public', f"name={name}, email={email}")
         
-        # For now, just return success (you can add email sending logic later)
-        # TODO: Implement email sending functionality
         return jsonify({
             'success': True, 
             'message': 'Thank you for your message! I\'ll get back to you soon.'
@@ -1277,17 +1929,40 @@ def contact_form():
     except Exception as e:
         return jsonify({'success': False, 'message': 'An error occurred. Please try again.'}), 500
 
+# Written by a background thread that also keeps the index current; see activity_log
+activity_index = ActivityIndex(LOG_FILE, LOG_INDEX)
+activity_log = ActivityLogWriter(LOG_FILE, max_queue=LOG_QUEUE_SIZE, max_bytes=LOG_MAX_BYTES,
+                                 rotate=LOG_ROTATE, backups=LOG_BACKUPS, index=activity_index)
+
 def log_admin_activity(action, section, details=None):
     """Log admin actions to a log file with timestamp, action, section, details, and username."""
     try:
         username = session.get('admin_username', 'unknown')
     except Exception:
         username = 'unknown'
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log_entry = f"[{timestamp}] | user={username} | action={action} | section={section} | details={details or ''}\n"
-    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-    with open(LOG_FILE, 'a', encoding='utf-8') as f:
-        f.write(log_entry)
+    record = make_record(action, section, details, user=username)
+    activity_log.submit(record, policy='drop' if action in PUBLIC_LOG_ACTIONS else 'block')
+
+# --- Background Workers ---
+# The image job and mail sender threads only run in processes that serve
+# requests. Scripts importing this module for its store and templates (like
+# export_static.py) must not claim jobs or mail they would abandon on exit.
+# The inbox and activity log writer threads start on their first write.
+_workers_started = False
+_workers_lock = threading.Lock()
+
+@app.before_request
+def start_background_workers():
+    """Start the image job and mail sender threads on this process's first request."""
+    global _workers_started
+    if _workers_started:
+        return
+    with _workers_lock:
+        if not _workers_started:
+            image_jobs.start()
+            if SMTP_HOST:
+                mail_sender.start()
+            _workers_started = True
 
 if __name__ == "__main__":
     initialize_json_data()
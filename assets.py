@@ -0,0 +1,244 @@
+import gzip
+import hashlib
+import os
+import re
+import threading
+
+from minify import extract_critical_css, minify_css, minify_js
+
+try:
+    import brotli
+except ImportError:  # optional, only .gz siblings are written without it
+    brotli = None
+
+STATIC_FOLDER = 'static'
+# Text assets worth shipping with precompressed .gz/.br siblings
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+# Directories whose files are served under fingerprinted names
+FINGERPRINTED_DIRS = ('css', 'js', 'images')
+DIGEST_LENGTH = 10
+# Minified copies are written next to their source as name.min.ext
+MINIFIED_SUFFIX = '.min'
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+# Pages whose above-the-fold CSS is inlined: (template, stylesheets it links)
+CRITICAL_CSS_PAGES = {
+    'index': ('templates/index.html', ['css/main_v3.css', 'css/index.css']),
+}
+# Marks the end of the above-the-fold markup in those templates
+CRITICAL_CSS_MARKER = '<!-- critical-css:end -->'
+# Cap on the inlined CSS, which every page response carries; rules past it
+# apply once the full stylesheet has loaded
+CRITICAL_CSS_MAX_BYTES = 14 * 1024
+FINGERPRINT_PATTERN = re.compile(r'^(?P<root>.+)\.(?P<digest>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % DIGEST_LENGTH)
+
+
+def file_digest(path, length=DIGEST_LENGTH):
+    """Return a short content hash of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def fingerprinted_name(rel_path, digest):
+    """Insert a content hash before the extension: css/app.css -> css/app.3f2a9c1b0d.css"""
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest}{ext}"
+
+
+def minified_name(rel_path):
+    """css/app.css -> css/app.min.css"""
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}{MINIFIED_SUFFIX}{ext}"
+
+
+def _is_fresh(target, sources):
+    """Whether target exists and is not older than any of sources."""
+    try:
+        built = os.path.getmtime(target)
+    except OSError:
+        return False
+    return all(os.path.getmtime(source) <= built for source in sources)
+
+
+def minify_assets(static_dir=STATIC_FOLDER):
+    """
+    Write minified .min siblings for the stylesheets and scripts in static_dir.
+
+    Returns:
+        list: Paths of the files that were (re)written
+    """
+    written = []
+    for directory, _, filenames in os.walk(static_dir):
+        for filename in sorted(filenames):
+            root, ext = os.path.splitext(filename)
+            if ext not in MINIFIERS or root.endswith((MINIFIED_SUFFIX, '.critical')):
+                continue
+            path = os.path.join(directory, filename)
+            target = os.path.join(directory, minified_name(filename))
+            if _is_fresh(target, [path]):
+                continue
+            with open(path, encoding='utf-8') as f:
+                source = f.read()
+            with open(target, 'w', encoding='utf-8') as f:
+                f.write(MINIFIERS[ext](source))
+            written.append(target)
+    return written
+
+
+def critical_css_path(page, static_dir=STATIC_FOLDER):
+    """Where the inlined critical CSS of a page is written."""
+    return os.path.join(static_dir, 'css', f"{page}.critical.css")
+
+
+def build_critical_css(static_dir=STATIC_FOLDER):
+    """
+    Extract the CSS used above the fold of each page in CRITICAL_CSS_PAGES.
+
+    The markup before CRITICAL_CSS_MARKER in the page template is matched
+    against the page's stylesheets, keeping at most CRITICAL_CSS_MAX_BYTES;
+    see minify.extract_critical_css.
+
+    Returns:
+        list: Paths of the files that were (re)written
+    """
+    written = []
+    for page, (template, stylesheets) in CRITICAL_CSS_PAGES.items():
+        sources = [os.path.join(static_dir, *rel_path.split('/')) for rel_path in stylesheets]
+        target = critical_css_path(page, static_dir)
+        if _is_fresh(target, [template] + sources):
+            continue
+        with open(template, encoding='utf-8') as f:
+            html = f.read()
+        if CRITICAL_CSS_MARKER not in html:
+            continue
+        css = ''
+        for source in sources:
+            with open(source, encoding='utf-8') as f:
+                css += minify_css(f.read())
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(extract_critical_css(css, html.split(CRITICAL_CSS_MARKER, 1)[0], CRITICAL_CSS_MAX_BYTES))
+        written.append(target)
+    return written
+
+
+def build_manifest(static_dir=STATIC_FOLDER):
+    """
+    Fingerprint every file under static_dir by content hash.
+
+    Returns:
+        dict: Maps each path relative to static_dir (with forward slashes)
+              to its fingerprinted relative path.
+    """
+    manifest = {}
+    for directory, _, filenames in os.walk(static_dir):
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            rel_path = os.path.relpath(path, static_dir).replace(os.sep, '/')
+            manifest[rel_path] = fingerprinted_name(rel_path, file_digest(path))
+    return manifest
+
+
+class AssetManifest:
+    """
+    Runtime view of the fingerprinted static files.
+
+    Digests are computed lazily and cached per file; each lookup stats the
+    file and hashes it again only when its mtime or size changed, so edits
+    during development get a new URL without restarting the app.
+    """
+
+    def __init__(self, static_dir=STATIC_FOLDER, directories=FINGERPRINTED_DIRS):
+        self.static_dir = static_dir
+        self.directories = directories
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def fingerprinted(self, rel_path):
+        """Whether a path relative to static_dir is served under a fingerprinted name."""
+        return rel_path.replace(os.sep, '/').lstrip('/').split('/', 1)[0] in self.directories
+
+    def digest(self, rel_path):
+        """Return the current content hash of a static file, or None if it is missing."""
+        path = os.path.join(self.static_dir, *rel_path.split('/'))
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(rel_path)
+        if entry is None or entry[0] != stamp:
+            entry = (stamp, file_digest(path))
+            with self._lock:
+                self._entries[rel_path] = entry
+        return entry[1]
+
+    def url_path(self, rel_path):
+        """
+        Map a static path to its fingerprinted name, or return it unchanged.
+
+        A stylesheet or script is swapped for its .min sibling when that is
+        up to date with the source.
+        """
+        rel_path = rel_path.lstrip('/')
+        if not self.fingerprinted(rel_path):
+            return rel_path
+        if os.path.splitext(rel_path)[1] in MINIFIERS:
+            minified = minified_name(rel_path)
+            if _is_fresh(os.path.join(self.static_dir, *minified.split('/')),
+                         [os.path.join(self.static_dir, *rel_path.split('/'))]):
+                rel_path = minified
+        digest = self.digest(rel_path)
+        return fingerprinted_name(rel_path, digest) if digest else rel_path
+
+    def resolve(self, hashed_path):
+        """
+        Map a fingerprinted name back to the file it was generated from.
+
+        Returns:
+            tuple or None: (original relative path, whether the digest still
+                           matches the file), or None when the name is not
+                           fingerprinted or the file does not exist
+        """
+        match = FINGERPRINT_PATTERN.match(hashed_path)
+        if not match:
+            return None
+        rel_path = match.group('root') + match.group('ext')
+        if not self.fingerprinted(rel_path):
+            return None
+        digest = self.digest(rel_path)
+        if digest is None:
+            return None
+        return rel_path, digest == match.group('digest')
+
+
+def precompress(static_dir=STATIC_FOLDER):
+    """
+    Write .gz (and .br, if brotli is installed) siblings for text assets.
+
+    Siblings that are already newer than their source are left alone.
+
+    Returns:
+        list: Paths of the files that were (re)compressed
+    """
+    written = []
+    for directory, _, filenames in os.walk(static_dir):
+        for filename in sorted(filenames):
+            if not filename.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(directory, filename)
+            targets = [(path + '.gz', lambda body: gzip.compress(body, 9, mtime=0))]
+            if brotli is not None:
+                targets.append((path + '.br', lambda body: brotli.compress(body, quality=11)))
+            body = None
+            for target, compress in targets:
+                if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                    continue
+                if body is None:
+                    with open(path, 'rb') as f:
+                        body = f.read()
+                with open(target, 'wb') as f:
+                    f.write(compress(body))
+                written.append(target)
+    return written
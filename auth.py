@@ -0,0 +1,151 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from werkzeug.security import check_password_hash
+
+from database import SQLiteDatabase
+
+
+class TokenBucket:
+    """Per-key token buckets held in memory.
+
+    Each key starts with ``capacity`` tokens and regains ``refill_rate``
+    tokens per second. Only keys that have spent tokens are stored, and at
+    most ``max_keys`` of them (the least recently used are forgotten, which
+    only ever errs towards letting a request through).
+    """
+
+    def __init__(self, capacity, refill_rate, max_keys=10000):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _take(self, tokens, updated, now, cost):
+        tokens = min(self.capacity, tokens + (now - updated) * self.refill_rate)
+        if tokens >= cost:
+            return tokens - cost, 0.0
+        return tokens, (cost - tokens) / self.refill_rate
+
+    def consume(self, key, cost=1):
+        """
+        Take cost tokens from key's bucket.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the number of
+                   seconds until enough tokens are available
+        """
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.capacity, now))
+            tokens, wait = self._take(tokens, updated, now, cost)
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+        return wait
+
+    def level(self, key):
+        """Tokens currently in key's bucket, without taking any."""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+    def reset(self, key):
+        """Refill key's bucket (e.g. after a successful login)."""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class SQLiteTokenBucket(TokenBucket):
+    """Token buckets shared by every worker process through a SQLite file.
+
+    Each consume() is one short BEGIN IMMEDIATE transaction, so workers see
+    each other's attempts. ``namespace`` lets several limiters share a file.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS buckets (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        tokens REAL NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS buckets_updated ON buckets (updated);
+    """
+
+    def __init__(self, path, namespace, capacity, refill_rate):
+        super().__init__(capacity, refill_rate)
+        self.path = path
+        self.namespace = namespace
+        self.db = SQLiteDatabase(path, self.SCHEMA, timeout=5)
+
+    def consume(self, key, cost=1):
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute('SELECT tokens, updated FROM buckets WHERE namespace = ? AND key = ?',
+                               (self.namespace, key)).fetchone()
+            tokens, wait = self._take(*(row or (self.capacity, now)), now, cost)
+            conn.execute('INSERT OR REPLACE INTO buckets (namespace, key, tokens, updated) VALUES (?, ?, ?, ?)',
+                         (self.namespace, key, tokens, now))
+            # Buckets idle long enough to be full again carry no information
+            conn.execute('DELETE FROM buckets WHERE namespace = ? AND updated < ?',
+                         (self.namespace, now - self.capacity / self.refill_rate))
+        return wait
+
+    def level(self, key):
+        now = time.time()
+        row = self.db.execute('SELECT tokens, updated FROM buckets WHERE namespace = ? AND key = ?',
+                              (self.namespace, key)).fetchone()
+        tokens, updated = row or (self.capacity, now)
+        return min(self.capacity, tokens + (now - updated) * self.refill_rate)
+
+    def reset(self, key):
+        self.db.execute('DELETE FROM buckets WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+
+def make_token_bucket(backend, namespace, capacity, refill_rate, sqlite_path=None):
+    """Create an in-memory ('memory') or shared ('sqlite') token bucket."""
+    if backend == 'sqlite':
+        return SQLiteTokenBucket(sqlite_path, namespace, capacity, refill_rate)
+    if backend == 'memory':
+        return TokenBucket(capacity, refill_rate)
+    raise ValueError(f"Unknown throttle backend: {backend!r}")
+
+
+class VerifierBusy(Exception):
+    """Raised when every password verification slot is taken."""
+
+
+class PasswordVerifier:
+    """Runs password hash checks on a small dedicated thread pool.
+
+    Hashing a pbkdf2 password deliberately takes a lot of CPU. Checks run on
+    ``workers`` threads (hashlib releases the GIL while hashing), with at
+    most ``max_pending`` checks running or waiting at once; further attempts
+    raise VerifierBusy immediately instead of queueing behind a burst.
+    """
+
+    def __init__(self, workers=2, max_pending=8, timeout=10):
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify')
+
+    def verify(self, stored_hash, password):
+        """Check password against stored_hash; raises VerifierBusy when saturated."""
+        if not self._slots.acquire(blocking=False):
+            raise VerifierBusy()
+        try:
+            future = self._executor.submit(check_password_hash, stored_hash, password)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the hash is done, even if the caller gives up waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise VerifierBusy() from None
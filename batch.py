@@ -0,0 +1,197 @@
+import re
+
+# Largest number of operations accepted in one batch
+MAX_OPERATIONS = 500
+OPERATIONS = ('add', 'edit', 'delete', 'reorder')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# Editable lists of a portfolio: required and optional item fields, and the
+# extra key that picks the list ('type' for skills, 'category' for experience)
+TARGETS = {
+    'skills': {
+        'required': ('name',),
+        'optional': ('description', 'icon'),
+        'selector': ('type', {'technical': 'technical', 'soft': 'soft'}),
+    },
+    'projects': {
+        'required': ('title', 'description'),
+        'optional': ('technologies', 'link'),
+    },
+    'experience': {
+        'required': ('title',),
+        'optional': ('description', 'company', 'duration', 'university', 'year', 'issuer', 'link'),
+        'selector': ('category', {'internship': 'internships', 'thesis': 'thesis',
+                                  'certification': 'certifications'}),
+    },
+    'education': {
+        'required': ('degree', 'university', 'year'),
+        'optional': ('description', 'gpa', 'honors', 'certificate_link'),
+    },
+    'hero_buttons': {
+        'required': ('text', 'link', 'icon'),
+        'optional': ('is_visible',),
+    },
+}
+# Contact details are a single record rather than a list: only 'edit' applies
+CONTACT_FIELDS = ('email', 'phone', 'linkedin', 'github')
+
+
+class BatchError(Exception):
+    """An operation that cannot be applied; ``index`` is its position in the batch."""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+        self.message = message
+
+
+def _check_item(index, op, fields, required, partial):
+    item = op.get('item')
+    if not isinstance(item, dict):
+        raise BatchError(index, "'item' must be an object")
+    unknown = set(item) - set(fields)
+    if unknown:
+        raise BatchError(index, f"Unknown fields: {', '.join(sorted(unknown))}")
+    for field in required if not partial else ():
+        if not item.get(field):
+            raise BatchError(index, f"'{field}' is required")
+    for field, value in item.items():
+        if field == 'technologies':
+            if not isinstance(value, (str, list)) or (isinstance(value, list) and
+                                                     not all(isinstance(t, str) for t in value)):
+                raise BatchError(index, "'technologies' must be a list or comma-separated string")
+        elif field == 'is_visible':
+            if not isinstance(value, bool):
+                raise BatchError(index, "'is_visible' must be true or false")
+        elif not isinstance(value, str):
+            raise BatchError(index, f"'{field}' must be a string")
+        elif field in required and not value.strip():
+            raise BatchError(index, f"'{field}' cannot be empty")
+
+
+def validate_operations(ops):
+    """
+    Check the shape of every operation without touching any data.
+
+    Returns:
+        list: Errors as {'index': ..., 'error': ...}; empty if all are well formed
+    """
+    if not isinstance(ops, list) or not ops:
+        return [{'index': None, 'error': "'ops' must be a non-empty list"}]
+    if len(ops) > MAX_OPERATIONS:
+        return [{'index': None, 'error': f"At most {MAX_OPERATIONS} operations per batch"}]
+    errors = []
+    for index, op in enumerate(ops):
+        try:
+            if not isinstance(op, dict):
+                raise BatchError(index, 'Operation must be an object')
+            action, target = op.get('op'), op.get('target')
+            if action not in OPERATIONS:
+                raise BatchError(index, f"'op' must be one of: {', '.join(OPERATIONS)}")
+            if target == 'contact':
+                if action != 'edit':
+                    raise BatchError(index, "Contact details only support 'edit'")
+                _check_item(index, op, CONTACT_FIELDS, ('email',), partial=True)
+                email = op['item'].get('email')
+                if email is not None and not EMAIL_PATTERN.match(email):
+                    raise BatchError(index, "'email' is not a valid email address")
+                continue
+            spec = TARGETS.get(target)
+            if spec is None:
+                raise BatchError(index, f"Unknown target: {target!r}")
+            if 'selector' in spec:
+                key, choices = spec['selector']
+                if op.get(key) not in choices:
+                    raise BatchError(index, f"'{key}' must be one of: {', '.join(choices)}")
+            if action in ('edit', 'delete') and (not isinstance(op.get('index'), int) or
+                                                 isinstance(op.get('index'), bool) or op['index'] < 0):
+                raise BatchError(index, "'index' must be a non-negative integer")
+            if action == 'reorder' and (not isinstance(op.get('order'), list) or
+                                        not all(isinstance(i, int) and not isinstance(i, bool)
+                                                for i in op['order'])):
+                raise BatchError(index, "'order' must be a list of indexes")
+            if action in ('add', 'edit'):
+                _check_item(index, op, spec['required'] + spec['optional'], spec['required'],
+                            partial=action == 'edit')
+        except BatchError as e:
+            errors.append({'index': e.index, 'error': e.message})
+    return errors
+
+
+def _normalize(item):
+    item = dict(item)
+    if isinstance(item.get('technologies'), str):
+        item['technologies'] = [t.strip() for t in item['technologies'].split(',') if t.strip()]
+    return item
+
+
+def _target_list(portfolio, op):
+    target = op['target']
+    if target == 'skills':
+        return portfolio.setdefault('skills', {}).setdefault(op['type'], [])
+    if target == 'projects':
+        return portfolio.setdefault('projects', [])
+    if target == 'experience':
+        key, choices = TARGETS['experience']['selector']
+        return portfolio.setdefault('experience', {}).setdefault(choices[op[key]], [])
+    if target == 'education':
+        return portfolio.setdefault('experience', {}).setdefault('education', [])
+    return portfolio.setdefault('about', {}).setdefault('hero_buttons', [])
+
+
+def apply_operations(portfolio, ops):
+    """
+    Apply validated operations to portfolio in order.
+
+    Each operation sees the result of the ones before it, so indexes refer to
+    the list as it is at that point in the batch. The first operation that
+    cannot be applied raises BatchError; callers apply batches to a copy, so
+    nothing is kept when that happens.
+
+    Returns:
+        list: One result per operation, e.g. {'index': 0, 'op': 'add', 'target': 'skills', 'position': 4}
+    """
+    results = []
+    for index, op in enumerate(ops):
+        action, target = op['op'], op['target']
+        result = {'index': index, 'op': action, 'target': target}
+        if target == 'contact':
+            portfolio.setdefault('contact', {}).update(op['item'])
+            results.append(result)
+            continue
+        items = _target_list(portfolio, op)
+        if action in ('edit', 'delete') and op['index'] >= len(items):
+            raise BatchError(index, f"No {target} entry at index {op['index']} (there are {len(items)})")
+        if action == 'add':
+            item = _normalize(op['item'])
+            if target == 'hero_buttons':
+                item.setdefault('is_visible', True)
+            items.append(item)
+            result['position'] = len(items) - 1
+        elif action == 'edit':
+            items[op['index']].update(_normalize(op['item']))
+            result['position'] = op['index']
+        elif action == 'delete':
+            del items[op['index']]
+        elif action == 'reorder':
+            if sorted(op['order']) != list(range(len(items))):
+                raise BatchError(index, f"'order' must list each index from 0 to {len(items) - 1} exactly once")
+            items[:] = [items[i] for i in op['order']]
+        results.append(result)
+    return results
+
+
+def describe(op):
+    """Short log description of an operation, in the style of the admin form handlers."""
+    parts = [f"{key}={op[key]}" for key in ('type', 'category', 'index') if key in op]
+    item = op.get('item') or {}
+    for field in ('name', 'title', 'degree', 'text', 'email'):
+        if field in item:
+            parts.append(f"{field}={item[field]}")
+            break
+    else:
+        if item:
+            parts.append(f"fields={','.join(sorted(item))}")
+    if op['op'] == 'reorder':
+        parts.append(f"order={op['order']}")
+    return ', '.join(parts)
@@ -0,0 +1,17 @@
+from assets import STATIC_FOLDER, build_critical_css, minify_assets, precompress
+
+def main():
+    # Extract above-the-fold CSS that templates inline
+    for path in build_critical_css(STATIC_FOLDER):
+        print(f"Extracted critical CSS to {path}")
+    # Minify stylesheets and scripts; asset_url() prefers the .min copies
+    for path in minify_assets(STATIC_FOLDER):
+        print(f"Minified {path}")
+    # Precompress text assets so the app can serve them without compressing per request
+    written = precompress(STATIC_FOLDER)
+    for path in written:
+        print(f"Compressed {path}")
+    print(f"Done: {len(written)} file(s) compressed")
+
+if __name__ == "__main__":
+    main()
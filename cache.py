@@ -0,0 +1,91 @@
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Values are usually ``bytes``; pass ``sizeof`` to cache anything else.
+    Entries larger than the whole budget are not cached at all.
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        nbytes = self._sizeof(value)
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.size += nbytes
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def _deflate(data, level, mode):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(mode)
+
+
+class GzipShell:
+    """A gzip body compressed once, with a fresh value spliced in per response.
+
+    The text around each ``placeholder`` is deflated on its own and ended
+    with a full flush, which byte-aligns the output and resets the history.
+    Independently compressed pieces can then be concatenated into one valid
+    stream, so render() only has to deflate the (short) value and checksum
+    the result. ``len()`` is the compressed size, for ByteLRUCache.
+    """
+
+    def __init__(self, body, placeholder, level=6):
+        self.level = level
+        self._parts = body.split(placeholder)
+        self._deflated = [_deflate(part, level, zlib.Z_FULL_FLUSH) for part in self._parts[:-1]]
+        self._deflated.append(_deflate(self._parts[-1], level, zlib.Z_FINISH))
+        self._length = len(body) - len(placeholder) * (len(self._parts) - 1)
+
+    def __len__(self):
+        return sum(len(piece) for piece in self._deflated)
+
+    def render(self, value):
+        """Return the gzip file for the body with every placeholder replaced by value."""
+        deflated_value = _deflate(value, self.level, zlib.Z_FULL_FLUSH)
+        crc = 0
+        chunks = [b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff']  # no name, mtime 0, unknown OS
+        for i, piece in enumerate(self._deflated):
+            if i:
+                crc = zlib.crc32(value, crc)
+                chunks.append(deflated_value)
+            crc = zlib.crc32(self._parts[i], crc)
+            chunks.append(piece)
+        length = self._length + len(value) * (len(self._parts) - 1)
+        chunks.append(struct.pack('<II', crc, length & 0xFFFFFFFF))
+        return b''.join(chunks)
@@ -0,0 +1,36 @@
+import os
+import sys
+from storage import FORMATS, DocumentStore, detect_format
+
+JSON_FILE = 'data/data.json'
+
+def convert_data(fmt, path=JSON_FILE):
+    """
+    Rewrite the portfolio data file in another on-disk format.
+
+    Args:
+        fmt (str): Target format, one of storage.FORMATS
+        path (str): Path to the data file
+    """
+    try:
+        with open(path, 'rb') as f:
+            current = detect_format(f.read())
+        before = os.path.getsize(path)
+
+        store = DocumentStore(path, fmt)
+        with store.transaction():
+            pass  # re-written in the new format on exit
+
+        after = os.path.getsize(path)
+        print(f"Converted {path} from {current} to {fmt}: {before} -> {after} bytes")
+    except Exception as e:
+        print(f"Error: {e}")
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in FORMATS:
+        print(f"Usage: python convert_data.py {{{'|'.join(FORMATS)}}} [data_file]")
+        sys.exit(1)
+    convert_data(sys.argv[1], *sys.argv[2:3])
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,148 @@
+import argparse
 import os
 import sys
-from PIL import Image
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from images import (DERIVATIVES_FOLDER, IMAGES_FOLDER, SOURCE_EXTENSIONS, cached_derivatives,
+                    generate_derivatives, images_available, load_manifest, locked_manifest,
+                    remember_derivatives)
+from storage import open_store
 
-def convert_to_webp_and_avif(input_path, quality=85):
+JSON_FILE = 'data/data.json'
+SQLITE_FILE = 'data/portfolio.db'
+# Admin uploads are saved into the images folder as well (see UPLOAD_FOLDER in app.py)
+SOURCE_DIRECTORIES = [IMAGES_FOLDER]
+
+def find_sources(directories):
+    """List the source images under the given directories, skipping generated derivatives."""
+    derivatives = os.path.abspath(DERIVATIVES_FOLDER)
+    sources = []
+    for top in dict.fromkeys(directories):
+        for directory, subdirs, filenames in os.walk(top):
+            subdirs[:] = [d for d in subdirs if os.path.abspath(os.path.join(directory, d)) != derivatives]
+            for filename in sorted(filenames):
+                if filename.lower().endswith(SOURCE_EXTENSIONS):
+                    sources.append(os.path.join(directory, filename))
+    return sources
+
+def convert_image(input_path):
     """
-    Convert an image to WebP and AVIF formats with the specified quality.
-    
-    Args:
-        input_path (str): Path to the input image file
-        quality (int): Quality of the output image (0-100)
+    Generate the responsive AVIF/WebP/JPEG derivatives of an image.
+
+    Runs in a worker process, so errors are returned rather than raised.
+
+    Returns:
+        tuple: (input_path, derivative record or None, error message or None, seconds)
     """
+    started = time.perf_counter()
     try:
-        # Open the image
-        img = Image.open(input_path)
-        
-        # Get the filename without extension
-        filename = os.path.splitext(os.path.basename(input_path))[0]
-        directory = os.path.dirname(input_path)
-        
-        # Create output paths
-        webp_path = os.path.join(directory, f"{filename}.webp")
-        
-        # Convert to WebP
-        img.save(webp_path, 'WEBP', quality=quality)
-        print(f"Converted {input_path} to WebP: {webp_path}")
-        
-        # For AVIF, we need to check if the pillow-avif-plugin is installed
-        try:
-            avif_path = os.path.join(directory, f"{filename}.avif")
-            img.save(avif_path, 'AVIF', quality=quality)
-            print(f"Converted {input_path} to AVIF: {avif_path}")
-        except Exception as e:
-            print(f"Could not convert to AVIF (you may need pillow-avif-plugin): {e}")
-    
+        record = generate_derivatives(input_path)
+        return input_path, record, None, time.perf_counter() - started
     except Exception as e:
-        print(f"Error converting {input_path}: {e}")
+        return input_path, None, str(e), time.perf_counter() - started
 
-def main():
-    # Convert hero image
-    hero_images = [
-        "static/images/shankar.jpg",
-        "static/images/shankar.jpeg",
-        "static/images/Shankar.png"
-    ]
-    
-    # Get current directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    for img_path in hero_images:
-        full_path = os.path.join(current_dir, img_path)
-        if os.path.exists(full_path):
-            print(f"Converting {full_path}...")
-            convert_to_webp_and_avif(full_path)
+def convert_all(directories, workers=None, force=False):
+    """
+    Convert every source image that changed since the last run, in parallel.
+
+    Args:
+        directories (list): Directories to scan for source images
+        workers (int): Worker processes (default: one per core)
+        force (bool): Ignore the manifest and convert everything
+
+    Returns:
+        dict: Maps /static/images/... paths to derivative records, for every
+              source that has current derivatives
+    """
+    started = time.perf_counter()
+    manifest = load_manifest()
+    sources = find_sources(directories)
+    records, pending = {}, []
+    for path in sources:
+        record = None if force else cached_derivatives(manifest, path)
+        if record:
+            records[path] = record
         else:
-            print(f"File not found: {full_path}")
+            pending.append(path)
+
+    failed, busy_seconds = 0, 0.0
+    if pending:
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        print(f"Converting {len(pending)} image(s) with {workers} worker(s)...")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(convert_image, path) for path in pending]
+            for future in as_completed(futures):
+                path, record, error, seconds = future.result()
+                busy_seconds += seconds
+                if record:
+                    records[path] = record
+                    remember_derivatives(manifest, path, record)
+                    count = sum(len(files) for files in record['sources'].values())
+                    print(f"  {path}: {count} derivative(s) in {seconds:.2f}s")
+                else:
+                    failed += 1
+                    print(f"  {path}: failed after {seconds:.2f}s ({error})")
+
+    # The manifest is only locked while merging, not for the whole run: the
+    # app may have processed uploads meanwhile, so their entries are kept.
+    # Sources deleted since the last run are forgotten; entries outside the
+    # scanned directories (e.g. uploads when only some/dir was converted) are kept
+    known = {os.path.relpath(path).replace(os.sep, '/') for path in sources}
+    current_keys = {os.path.relpath(path).replace(os.sep, '/') for path in records}
+    scanned = tuple(os.path.join(os.path.abspath(directory), '') for directory in directories)
+    with locked_manifest() as current:
+        current.update((key, manifest[key]) for key in current_keys)
+        for key in [key for key in current if key not in known and os.path.abspath(key).startswith(scanned)]:
+            del current[key]
+
+    elapsed = time.perf_counter() - started
+    print(f"Summary: {len(sources)} source(s), {len(pending) - failed} converted, "
+          f"{len(sources) - len(pending)} up to date, {failed} failed in {elapsed:.2f}s"
+          + (f" ({busy_seconds:.2f}s of encoding, {busy_seconds / elapsed:.1f}x parallel)" if pending else ""))
+    return {'/' + os.path.relpath(path).replace(os.sep, '/'): record for path, record in records.items()}
+
+def record_derivatives(records):
+    """
+    Attach derivative records to every profile_picture that uses the source image.
+
+    The portfolio data is only written when a record actually changed.
+
+    Args:
+        records (dict): Maps /static/images/... paths to derivative records
+    """
+    # Same backend and on-disk format as app.py, so the file is not rewritten in another format
+    store = open_store(os.environ.get('PORTFOLIO_STORAGE', 'json'), JSON_FILE, SQLITE_FILE,
+                       os.environ.get('PORTFOLIO_DATA_FORMAT', 'pretty'))
+    with store.locked():
+        data = store.load_copy()
+        pictures = [data.get('profile_picture')] + [portfolio.get('profile_picture') for portfolio in data.get('portfolios', [])]
+        changed = 0
+        for picture in pictures:
+            record = records.get(picture.get('filepath')) if picture else None
+            if record and any(picture.get(key) != value for key, value in record.items()):
+                picture.update(record)
+                changed += 1
+                print(f"Updated profile picture {picture['filepath']}")
+        if changed:
+            store.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate responsive image derivatives.")
+    parser.add_argument('directories', nargs='*', help="Directories to scan (default: static/images)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per core)")
+    parser.add_argument('--force', action='store_true', help="Convert every image, even if up to date")
+    args = parser.parse_args()
+
+    if not images_available():
+        print("Pillow is not installed; run 'pip install Pillow' first.")
+        sys.exit(1)
+
+    # Paths in the manifest and the portfolio data are relative to the project root
+    directories = [os.path.abspath(directory) for directory in args.directories] or SOURCE_DIRECTORIES
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    records = convert_all(directories, workers=args.workers, force=args.force)
+    if records:
+        record_derivatives(records)
 
 if __name__ == "__main__":
     main()
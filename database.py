@@ -0,0 +1,169 @@
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class SQLiteDatabase:
+    """A SQLite file shared by the threads of every worker process.
+
+    Each thread gets its own connection, in autocommit mode so single
+    statements need no explicit transaction, with ``synchronous=NORMAL``
+    (durable enough in WAL mode, and much cheaper per commit). The file,
+    WAL mode and ``schema`` are set up by the first connection a process
+    opens, so creating the object touches nothing on disk.
+    """
+
+    def __init__(self, path, schema='', timeout=30, row_factory=None):
+        self.path = path
+        self.schema = schema
+        self.timeout = timeout
+        self.row_factory = row_factory
+        self._local = threading.local()
+        self._ready = False
+
+    def connection(self):
+        """Return this thread's connection, opening it (and the file) on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not self._ready:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            if not self._ready:
+                conn.execute('PRAGMA journal_mode=WAL')
+                if self.schema:
+                    conn.executescript(self.schema)
+                self._ready = True
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.row_factory = self.row_factory
+            self._local.conn = conn
+        return conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql, rows):
+        return self.connection().executemany(sql, rows)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Run the block in a BEGIN IMMEDIATE transaction and yield the connection.
+
+        IMMEDIATE takes the write lock up front, so a read-then-write inside
+        the block cannot be interleaved with another writer's.
+        """
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+class BatchWriter:
+    """Background thread that drains a bounded queue in batches.
+
+    put() only queues an item. The thread waits for the first item, then
+    keeps collecting for up to ``flush_interval`` seconds or ``batch_size``
+    items and hands the whole list to ``write_batch``, so a burst costs one
+    write (or one transaction) instead of one per item.
+
+    Items that do not fit in the queue, or whose batch failed with an
+    OSError or sqlite3.Error, are counted in ``dropped``; such errors never
+    stop the thread. The thread starts with the first put(), so a process
+    that never writes never runs it. ``on_close`` runs on the thread after
+    the last batch.
+    """
+
+    def __init__(self, write_batch, name, max_queue=10000, batch_size=500, flush_interval=1.0, on_close=None):
+        self.write_batch = write_batch
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_close = on_close
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def put(self, item, timeout=None):
+        """
+        Queue an item, waiting up to timeout seconds for room (None: not at all).
+
+        Returns:
+            bool: False if the item was dropped because the queue was full
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            if timeout is None:
+                self._queue.put_nowait(item)
+            else:
+                self._queue.put(item, timeout=timeout)
+            return True
+        except queue.Full:
+            self.count_dropped(1)
+            return False
+
+    def count_dropped(self, count):
+        """Add count to ``dropped`` (put() runs on many request threads at once)."""
+        with self._dropped_lock:
+            self.dropped += count
+
+    def take_dropped(self):
+        """Return ``dropped`` and reset it to zero, e.g. once the loss has been reported."""
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    def flush(self):
+        """Block until every item queued so far has been written."""
+        self._queue.join()
+
+    def close(self):
+        """Write out the queue and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None and len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    self.write_batch(items)
+            except (OSError, sqlite3.Error):
+                self.count_dropped(len(items))  # a full disk or locked database must not kill the writer
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                if self.on_close:
+                    self.on_close()
+                return
@@ -0,0 +1,160 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+from assets import build_manifest
+
+try:
+    import brotli
+except ImportError:  # optional, .br files are skipped without it
+    brotli = None
+
+DEFAULT_OUTPUT = 'dist'
+STATE_FILE = '.export-state.json'
+TEMPLATE_FILES = ['templates/index.html', 'templates/maintenance.html']
+
+def write_file(path, body, compress=True):
+    """Write a file plus precompressed .gz/.br siblings next to it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(body)
+    if compress:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(body, 9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(body, quality=11))
+
+def copy_static(output_dir, manifest):
+    """Copy static files under both their plain and fingerprinted names."""
+    for rel_path, hashed_path in manifest.items():
+        source = os.path.join('static', rel_path)
+        for target_rel in (rel_path, hashed_path):
+            target = os.path.join(output_dir, 'static', target_rel)
+            if os.path.exists(target) and os.path.getsize(target) == os.path.getsize(source) \
+                    and os.path.getmtime(target) >= os.path.getmtime(source):
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copy2(source, target)
+            if target_rel == hashed_path and rel_path.endswith(('.css', '.js', '.svg')):
+                with open(target, 'rb') as f:
+                    write_file(target, f.read())
+
+def fingerprint_urls(html, manifest):
+    """Point /static/... references at fingerprinted copies and drop ?v= busters."""
+    def replace(match):
+        hashed = manifest.get(match.group(1))
+        return f"/static/{hashed}" if hashed else match.group(0)
+    return re.sub(r'/static/([^"\'?\s)]+)(?:\?v=\d+)?', replace, html)
+
+def export_site(output_dir=DEFAULT_OUTPUT, base_url='http://localhost/', force=False):
+    """
+    Render every portfolio to static HTML/JSON files.
+
+    Only portfolios whose content, the settings, the templates or the static
+    assets changed since the last export are rendered again.
+
+    Args:
+        output_dir (str): Directory to write the site into
+        base_url (str): Public URL the site will be served from
+        force (bool): Re-render everything regardless of the saved state
+    """
+    # Importing app starts no background threads (see start_background_workers)
+    from app import app, render_template, store, settings_payload
+
+    index = store.index()
+    data = index.data
+    settings = index.settings
+    if not settings.get('allow_public_access', True):
+        print("Public access is disabled in the settings; nothing exported.")
+        return False
+    # Like the live site: pages show the maintenance notice and the JSON
+    # files only carry the error the API would answer with
+    maintenance = settings.get('maintenance_mode')
+    maintenance_body = json.dumps({'error': 'Site is under maintenance'}).encode('utf-8')
+
+    manifest = build_manifest()
+    template_hash = hashlib.sha1()
+    for path in TEMPLATE_FILES:
+        with open(path, 'rb') as f:
+            template_hash.update(f.read())
+    shared_version = f"{template_hash.hexdigest()[:12]}-{index.settings_version}-" \
+                     f"{hashlib.sha1(json.dumps(manifest, sort_keys=True).encode()).hexdigest()[:12]}-{base_url}"
+
+    state_path = os.path.join(output_dir, STATE_FILE)
+    state = {}
+    if not force and os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    new_state = {}
+
+    copy_static(output_dir, manifest)
+
+    def render_page(url_path, page_data):
+        with app.test_request_context(url_path, base_url=base_url):
+            if maintenance:
+                html = render_template('maintenance.html')
+            else:
+                html = render_template('index.html', data=page_data, server_rendered=True, csrf_token=lambda: '')
+        return fingerprint_urls(html, manifest).encode('utf-8')
+
+    rendered = skipped = 0
+    active = index.active
+    for portfolio in data.get('portfolios', []):
+        portfolio_id = portfolio.get('id')
+        version = f"{index.versions[portfolio_id]}-{shared_version}"
+        if active is not None and active.get('id') == portfolio_id:
+            version += '-active'
+        new_state[portfolio_id] = version
+        if state.get(portfolio_id) == version:
+            skipped += 1
+            continue
+
+        page_data = dict(portfolio, settings=settings)
+        if maintenance:
+            api_body = maintenance_body
+        else:
+            api_body = json.dumps(page_data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        write_file(os.path.join(output_dir, 'portfolio', portfolio_id, 'index.html'),
+                   render_page(f'/portfolio/{portfolio_id}', page_data))
+        write_file(os.path.join(output_dir, 'portfolio', portfolio_id, 'api'), api_body)
+        if portfolio is active:
+            write_file(os.path.join(output_dir, 'index.html'), render_page('/', page_data))
+            write_file(os.path.join(output_dir, 'api', 'portfolio_data'), api_body)
+        rendered += 1
+        print(f"Rendered portfolio '{portfolio_id}'")
+
+    if maintenance:
+        settings_body = maintenance_body
+    else:
+        settings_body = json.dumps(settings_payload(index), ensure_ascii=False, sort_keys=True).encode('utf-8')
+    write_file(os.path.join(output_dir, 'api', 'settings'), settings_body)
+
+    # Remove portfolios that no longer exist
+    for portfolio_id in set(state) - set(new_state):
+        shutil.rmtree(os.path.join(output_dir, 'portfolio', portfolio_id), ignore_errors=True)
+        print(f"Removed portfolio '{portfolio_id}'")
+
+    os.makedirs(output_dir, exist_ok=True)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(new_state, f, indent=4)
+    print(f"Exported to {output_dir}: {rendered} rendered, {skipped} unchanged")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Export all portfolios as a static site.")
+    parser.add_argument('output_dir', nargs='?', default=DEFAULT_OUTPUT)
+    parser.add_argument('--base-url', default='http://localhost/',
+                        help="public URL of the site, used for absolute links")
+    parser.add_argument('--force', action='store_true', help="re-render every portfolio")
+    args = parser.parse_args()
+    if not export_site(args.output_dir, args.base_url, args.force):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import contextlib
+import json
+import os
+
+from assets import file_digest
+from storage import file_lock
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional, uploads are stored as-is without it
+    Image = ImageOps = None
+
+IMAGES_FOLDER = 'static/images'
+# Derivatives live in a subfolder so they never collide with uploads
+DERIVATIVES_FOLDER = os.path.join(IMAGES_FOLDER, 'responsive')
+# Records which sources the derivatives were generated from (see cached_derivatives)
+MANIFEST_FILE = os.path.join(DERIVATIVES_FOLDER, 'manifest.json')
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+# The profile picture renders at most 350 CSS px wide; 720 covers 2x screens
+DERIVATIVE_WIDTHS = (240, 360, 480, 720)
+# Preferred order: the first format a browser supports wins in <picture>
+DERIVATIVE_FORMATS = {
+    'avif': {'format': 'AVIF', 'mimetype': 'image/avif', 'options': {'quality': 60}},
+    'webp': {'format': 'WEBP', 'mimetype': 'image/webp', 'options': {'quality': 80, 'method': 6}},
+    'jpeg': {'format': 'JPEG', 'mimetype': 'image/jpeg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+
+
+def images_available():
+    """Whether Pillow is installed and derivatives can be generated."""
+    return Image is not None
+
+
+def _flatten(img):
+    """Drop the alpha channel onto a white background (for JPEG)."""
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def derivative_widths(original_width, widths=DERIVATIVE_WIDTHS):
+    """Widths to generate for an image: never upscale, always at least one."""
+    chosen = [width for width in widths if width < original_width]
+    if len(chosen) < len(widths):
+        chosen.append(original_width)
+    return chosen
+
+
+def generate_derivatives(source_path, output_dir=DERIVATIVES_FOLDER, url_prefix='/static/images/responsive',
+                         widths=DERIVATIVE_WIDTHS, formats=DERIVATIVE_FORMATS):
+    """
+    Write resized, metadata-free copies of an image in several formats.
+
+    EXIF orientation is applied to the pixels, then EXIF, ICC and other
+    metadata are left out of the outputs. Formats the installed Pillow cannot
+    encode (AVIF on older versions) are skipped.
+
+    Args:
+        source_path (str): Image to process
+        output_dir (str): Directory for the derivatives
+        url_prefix (str): URL path output_dir is served under
+        widths (tuple): Target widths in pixels
+        formats (dict): Output formats, as in DERIVATIVE_FORMATS
+
+    Returns:
+        dict: {'width', 'height', 'sources': {format: [{'width', 'filepath'}, ...]}}
+              describing the original size and the derivatives, smallest first
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required to generate image derivatives")
+    os.makedirs(output_dir, exist_ok=True)
+    # Keep the source extension in the name: shankar.jpg and shankar.png must not collide
+    stem, ext = os.path.splitext(os.path.basename(source_path))
+    stem = f"{stem}-{ext.lstrip('.').lower()}" if ext else stem
+    with Image.open(source_path) as opened:
+        img = ImageOps.exif_transpose(opened)
+        img.load()
+    original_width, original_height = img.size
+
+    sources = {}
+    for width in derivative_widths(original_width, widths):
+        height = max(1, round(original_height * width / original_width))
+        resized = img if width == original_width else img.resize((width, height), Image.LANCZOS)
+        for name, spec in formats.items():
+            frame = _flatten(resized) if spec['format'] == 'JPEG' else resized
+            if frame.mode not in ('RGB', 'RGBA'):
+                frame = frame.convert('RGBA' if 'A' in frame.getbands() else 'RGB')
+            filename = f"{stem}-{width}w.{name}"
+            path = os.path.join(output_dir, filename)
+            try:
+                frame.save(path, spec['format'], **spec['options'])
+            except (KeyError, OSError, ValueError):
+                # Encoder not available in this Pillow build
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                continue
+            sources.setdefault(name, []).append({'width': width, 'filepath': f"{url_prefix}/{filename}"})
+    return {'width': original_width, 'height': original_height, 'sources': sources}
+
+
+# --- Derivative manifest ---
+# Maps each source path to {'stamp': [mtime_ns, size], 'digest', 'record'}.
+# A source whose content hash matches and whose outputs all exist is not
+# converted again; the stamp avoids re-hashing files that were not touched.
+
+def load_manifest(path=MANIFEST_FILE):
+    """Read the derivative manifest; a missing or unreadable file is empty."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """Write the derivative manifest atomically."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+@contextlib.contextmanager
+def locked_manifest(path=MANIFEST_FILE):
+    """
+    Load the manifest under an exclusive file lock and save it after the block.
+
+    The upload jobs and convert_images.py both update the manifest, from
+    different processes; holding the lock from load to save keeps one from
+    overwriting entries the other just added. Nothing is saved if the block
+    raises.
+    """
+    with file_lock(path + '.lock'):
+        manifest = load_manifest(path)
+        yield manifest
+        save_manifest(manifest, path)
+
+
+def _manifest_key(source_path):
+    return os.path.relpath(source_path).replace(os.sep, '/')
+
+
+def _stamp(source_path):
+    st = os.stat(source_path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def cached_derivatives(manifest, source_path, output_dir=DERIVATIVES_FOLDER):
+    """
+    Return the recorded derivatives of source_path if they are still current.
+
+    Returns:
+        dict or None: The derivative record, or None when the source changed,
+                      was never converted, or an output file is missing
+    """
+    entry = manifest.get(_manifest_key(source_path))
+    if not entry:
+        return None
+    stamp = _stamp(source_path)
+    if entry['stamp'] != stamp:
+        if entry['digest'] != file_digest(source_path, 16):
+            return None
+        entry['stamp'] = stamp  # touched but unchanged
+    record = entry['record']
+    for sources in record['sources'].values():
+        for source in sources:
+            if not os.path.exists(os.path.join(output_dir, os.path.basename(source['filepath']))):
+                return None
+    return record
+
+
+def remember_derivatives(manifest, source_path, record):
+    """Record the derivatives generated from source_path in the manifest."""
+    manifest[_manifest_key(source_path)] = {
+        'stamp': _stamp(source_path),
+        'digest': file_digest(source_path, 16),
+        'record': record,
+    }
@@ -0,0 +1,160 @@
+import atexit
+import hashlib
+import re
+import sqlite3
+import time
+
+from database import BatchWriter, SQLiteDatabase
+
+
+class Inbox:
+    """Contact form submissions stored in a SQLite file.
+
+    Requests only put submissions on an in-memory queue; a writer thread
+    inserts them in batches, one transaction per batch, so a burst of
+    submissions costs one commit instead of one per request.
+
+    A sender repeating a message they already sent (same email, same text)
+    does not add a row: the existing submission's ``copies`` count goes up
+    instead, so a form resubmitted or spammed from one address shows up
+    once in the inbox. A repeat arriving more than ``repeat_window`` seconds
+    after the previous copy is news again: the submission moves back to the
+    top of the inbox as unread, with the sender's latest name and subject.
+
+    Listing uses keyset pagination on (received_at, id): each page starts
+    where the previous one ended, found through an index, so reading page
+    500 costs the same as reading page 1.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS submissions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        received_at REAL NOT NULL,
+        last_received_at REAL NOT NULL,
+        name TEXT NOT NULL,
+        email TEXT NOT NULL,
+        subject TEXT NOT NULL DEFAULT '',
+        message TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        copies INTEGER NOT NULL DEFAULT 1,
+        is_read INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE UNIQUE INDEX IF NOT EXISTS submissions_sender_digest ON submissions (email, digest);
+    CREATE INDEX IF NOT EXISTS submissions_received ON submissions (received_at, id);
+    CREATE INDEX IF NOT EXISTS submissions_email ON submissions (email, received_at, id);
+    CREATE INDEX IF NOT EXISTS submissions_unread ON submissions (is_read, received_at, id);
+    """
+
+    # The last parameter is repeat_window; SET expressions see the row as it was
+    INSERT = (
+        'INSERT INTO submissions (received_at, last_received_at, name, email, subject, message, digest) '
+        'VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7) '
+        'ON CONFLICT (email, digest) DO UPDATE SET '
+        'copies = copies + 1, last_received_at = excluded.last_received_at, '
+        'is_read = CASE WHEN excluded.received_at - last_received_at > ?8 THEN 0 ELSE is_read END, '
+        'received_at = CASE WHEN excluded.received_at - last_received_at > ?8 '
+        'THEN excluded.received_at ELSE received_at END, '
+        'name = CASE WHEN excluded.received_at - last_received_at > ?8 THEN excluded.name ELSE name END, '
+        'subject = CASE WHEN excluded.received_at - last_received_at > ?8 THEN excluded.subject ELSE subject END'
+    )
+
+    def __init__(self, path, max_queue=10000, batch_size=200, flush_interval=0.5, block_timeout=1.0,
+                 repeat_window=24 * 60 * 60):
+        self.path = path
+        self.block_timeout = block_timeout
+        self.repeat_window = repeat_window
+        self.db = SQLiteDatabase(path, self.SCHEMA, row_factory=sqlite3.Row)
+        self._writer = BatchWriter(self._insert, 'inbox-writer', max_queue, batch_size, flush_interval)
+        atexit.register(self.close)
+
+    @property
+    def dropped(self):
+        """Submissions lost to a full queue or a failed insert."""
+        return self._writer.dropped
+
+    @staticmethod
+    def digest(message):
+        """Fingerprint of a message's text, ignoring case and whitespace."""
+        normalized = re.sub(r'\s+', ' ', message).strip().lower()
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    # --- Writing ---
+
+    def submit(self, name, email, subject, message):
+        """
+        Queue a submission to be stored.
+
+        Returns:
+            bool: False if it was dropped because the queue stayed full
+        """
+        now = time.time()
+        row = (now, now, name, email.lower(), subject or '', message, self.digest(message))
+        return self._writer.put(row, timeout=self.block_timeout)
+
+    def flush(self):
+        """Block until every submission queued so far has been stored."""
+        self._writer.flush()
+
+    def close(self):
+        """Store the queued submissions and stop the writer thread."""
+        self._writer.close()
+
+    def _insert(self, rows):
+        with self.db.transaction() as conn:
+            conn.executemany(self.INSERT, [row + (self.repeat_window,) for row in rows])
+
+    # --- Reading ---
+
+    def page(self, limit=25, before=None, unread_only=False, email=None):
+        """
+        Return one page of submissions, newest first.
+
+        Args:
+            limit (int): Page size
+            before (str): Cursor returned with the previous page, or None for the newest
+            unread_only (bool): Only unread submissions
+            email (str): Only submissions from this address
+
+        Returns:
+            tuple: (list of submission dicts, cursor for the next page or None)
+        """
+        clauses, params = [], []
+        if unread_only:
+            clauses.append('is_read = 0')
+        if email:
+            clauses.append('email = ?')
+            params.append(email.lower())
+        position = self.parse_cursor(before)
+        if position:
+            clauses.append('(received_at, id) < (?, ?)')
+            params.extend(position)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        rows = self.db.execute(
+            f'SELECT * FROM submissions {where}ORDER BY received_at DESC, id DESC LIMIT ?',
+            params + [limit + 1]).fetchall()
+        rows = [dict(row) for row in rows]
+        cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            cursor = f"{rows[-1]['received_at']!r}:{rows[-1]['id']}"
+        return rows, cursor
+
+    @staticmethod
+    def parse_cursor(cursor):
+        """Split a page cursor into (received_at, id); None if missing or malformed."""
+        try:
+            received_at, submission_id = cursor.split(':')
+            return float(received_at), int(submission_id)
+        except (AttributeError, ValueError):
+            return None
+
+    def unread_count(self):
+        return self.db.execute('SELECT COUNT(*) FROM submissions WHERE is_read = 0').fetchone()[0]
+
+    def mark_read(self, submission_ids, read=True):
+        self.db.executemany('UPDATE submissions SET is_read = ? WHERE id = ?',
+                            [(int(read), submission_id) for submission_id in submission_ids])
+
+    def delete(self, submission_ids):
+        self.db.executemany('DELETE FROM submissions WHERE id = ?',
+                            [(submission_id,) for submission_id in submission_ids])
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+from database import SQLiteDatabase
+
+
+class JobQueue:
+    """Runs slow work (image processing) on background threads, with jobs kept in SQLite.
+
+    Jobs are rows in a SQLite file shared by every worker process, so a job's
+    status can be polled from whichever process serves the request, and a
+    job that was still queued (or running) when its process exited is picked
+    up by another one: running jobs hold a lease of ``lease`` seconds and
+    are claimed again once it expires, up to ``max_attempts`` times.
+
+    Handlers are registered by kind and get the job's JSON-serializable
+    arguments. Jobs of one kind run one at a time in submission order,
+    across all processes, so the last upload is also applied last. Only the
+    most recent ``history`` finished jobs are kept.
+
+    Submitting only needs the database; jobs run on the threads started by
+    start(), in whichever processes call it.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        args TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        created_at REAL NOT NULL,
+        finished_at REAL,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS jobs_pending ON jobs (status, kind, created_at);
+    CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+    """
+
+    def __init__(self, path, workers=1, history=50, lease=300, max_attempts=3, poll_interval=5):
+        self.path = path
+        self.history = history
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._wake = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.db = SQLiteDatabase(path, self.SCHEMA, row_factory=sqlite3.Row)
+        self._threads = [threading.Thread(target=self._run, name=f'jobs-{i}', daemon=True) for i in range(workers)]
+
+    def register(self, kind, func):
+        """Run func(*args) for jobs of this kind."""
+        self._handlers[kind] = func
+
+    def start(self):
+        """Start the worker threads of this process (once)."""
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                for thread in self._threads:
+                    thread.start()
+
+    def submit(self, kind, *args):
+        """
+        Queue a job of a registered kind and return its id.
+
+        The return value of the handler becomes the job's result; an
+        exception marks the job as failed with its message as the error.
+        """
+        job_id = uuid.uuid4().hex
+        self.db.execute(
+            'INSERT INTO jobs (id, kind, args, created_at) VALUES (?, ?, ?, ?)',
+            (job_id, kind, json.dumps(args), time.time()))
+        self._wake.set()
+        return job_id
+
+    def _claim(self):
+        """Lease the oldest runnable job of a kind this process handles, or return None."""
+        if not self._handlers:
+            return None
+        now = time.time()
+        kinds = list(self._handlers)
+        marks = ','.join('?' * len(kinds))
+        with self.db.transaction() as conn:
+            # Expired leases belong to a process that died mid-job
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', finished_at = ?, error = 'Gave up after repeated interruptions' "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?", (now, now, self.max_attempts))
+            row = conn.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({marks}) AND "
+                f"(status = 'queued' OR (status = 'running' AND lease_until < ?)) "
+                f"AND NOT EXISTS (SELECT 1 FROM jobs AS busy WHERE busy.kind = jobs.kind "
+                f"AND busy.status = 'running' AND busy.lease_until >= ?) "
+                f"ORDER BY created_at LIMIT 1", kinds + [now, now]).fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', lease_until = ?, attempts = attempts + 1 "
+                             "WHERE id = ?", (now + self.lease, row['id']))
+        return dict(row) if row is not None else None
+
+    def _finish(self, job_id, status, result=None, error=None):
+        conn = self.db.connection()
+        conn.execute('UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL '
+                     'WHERE id = ?', (status, json.dumps(result), error, time.time(), job_id))
+        conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND id NOT IN "
+                     "(SELECT id FROM jobs WHERE finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?)",
+                     (self.history,))
+
+    def _run(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            try:
+                result = self._handlers[job['kind']](*json.loads(job['args']))
+            except Exception as e:
+                self._finish(job['id'], 'failed', error=str(e) or e.__class__.__name__)
+            else:
+                self._finish(job['id'], 'done', result=result)
+            self._wake.set()  # the next job of this kind may be runnable now
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        del job['args'], job['lease_until']
+        return job
+
+    def get(self, job_id):
+        """Return a job's state, or None if it is unknown."""
+        row = self.db.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def recent(self, kind=None):
+        """Return the remembered jobs, newest first."""
+        rows = self.db.execute(
+            'SELECT * FROM jobs WHERE ? IS NULL OR kind = ? ORDER BY created_at DESC', (kind, kind)).fetchall()
+        return [self._to_dict(row) for row in rows]
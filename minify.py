@@ -0,0 +1,298 @@
+"""
+Dependency-free CSS/JS minifiers and critical CSS extraction.
+
+The minifiers are deliberately conservative: they only remove comments and
+whitespace, never rename or rewrite code. The JS minifier keeps line breaks
+so automatic semicolon insertion behaves exactly as in the source.
+"""
+import re
+
+_CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+_CSS_TOKENS = re.compile(_CSS_STRING.pattern + r'|/\*.*?\*/', re.S)
+# One statement (a block prelude or a declaration) and the character ending it
+_CSS_STATEMENT = re.compile(r'((?:' + _CSS_STRING.pattern[1:-1] + r'|[^{};"\'])*)([{};]|$)')
+_JS_WORD = re.compile(r'[\w$\\]')
+# Characters after which a '/' starts a regex literal rather than a division
+_JS_REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^}')
+_JS_REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete',
+                      'void', 'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet."""
+    source = _CSS_TOKENS.sub(lambda match: match.group(1) or ' ', source)
+    parts = []
+    for index, text in enumerate(_CSS_STRING.split(source)):
+        if index % 2:  # quoted string
+            parts.append(text)
+            continue
+        text = re.sub(r'\s+', ' ', text)
+        text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+        text = text.replace(': ', ':').replace(' !important', '!important').replace(';}', '}')
+        parts.append(text)
+    return _tighten_declarations(''.join(parts).strip()) + '\n'
+
+
+def _tighten_declarations(css):
+    """Drop the space before ':' in declarations, where it never matters.
+
+    In selectors it does ('a :hover' is not 'a:hover'), so block preludes
+    are left alone.
+    """
+    def tighten(match):
+        text, end = match.groups()
+        if end == '{':
+            return match.group(0)
+        return ''.join(part if index % 2 else part.replace(' :', ':')
+                       for index, part in enumerate(_CSS_STRING.split(text))) + end
+    return _CSS_STATEMENT.sub(tighten, css)
+
+
+def minify_js(source):
+    """Strip comments, indentation and blank lines from a script."""
+    out = []
+    templates = []  # brace depth at which each open ${...} substitution started
+    depth = 0
+    last = ''  # last significant character written
+    last_word = ''
+    pending_space = pending_newline = False
+    i, n = 0, len(source)
+
+    def emit(text, first):
+        nonlocal pending_space, pending_newline
+        if out:
+            if pending_newline:
+                out.append('\n')
+            elif pending_space and (
+                    (_JS_WORD.match(last) and _JS_WORD.match(first)) or
+                    (last in '+-' and first in '+-') or (last == '/' and first == '/')):
+                out.append(' ')
+        pending_space = pending_newline = False
+        out.append(text)
+
+    while i < n:
+        c = source[i]
+        if c in ' \t\r\n\f\v':
+            j = i
+            while j < n and source[j] in ' \t\r\n\f\v':
+                j += 1
+            if '\n' in source[i:j]:
+                pending_newline = True
+            else:
+                pending_space = True
+            i = j
+        elif source.startswith('//', i):
+            j = source.find('\n', i)
+            i = n if j == -1 else j
+        elif source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            j = n if j == -1 else j + 2
+            if '\n' in source[i:j]:
+                pending_newline = True
+            else:
+                pending_space = True
+            i = j
+        elif c in '\'"':
+            j = _skip_quoted(source, i, c)
+            emit(source[i:j], c)
+            last, last_word, i = c, '', j
+        elif c == '`' or (c == '}' and templates and templates[-1] == depth):
+            if c == '}':
+                templates.pop()
+            j = i + 1
+            while j < n:
+                if source[j] == '\\':
+                    j += 2
+                elif source[j] == '`':
+                    j += 1
+                    last = '`'
+                    break
+                elif source.startswith('${', j):
+                    templates.append(depth)
+                    j += 2
+                    last = '{'
+                    break
+                else:
+                    j += 1
+            emit(source[i:j], c)
+            last_word, i = '', j
+        elif c == '/' and (not last or last in _JS_REGEX_PREFIX or last_word in _JS_REGEX_KEYWORDS):
+            j = _skip_regex(source, i)
+            emit(source[i:j], c)
+            last, last_word, i = '/', '', j
+        elif _JS_WORD.match(c):
+            j = i + 1
+            while j < n and _JS_WORD.match(source[j]):
+                j += 1
+            word = source[i:j]
+            emit(word, c)
+            last, last_word, i = word[-1], word, j
+        else:
+            if c == '{':
+                depth += 1
+            elif c == '}':
+                depth -= 1
+            emit(c, c)
+            last, last_word, i = c, '', i + 1
+    return ''.join(out) + '\n'
+
+
+def _skip_quoted(source, start, quote):
+    """Return the index just past the string literal starting at start."""
+    i = start + 1
+    while i < len(source):
+        if source[i] == '\\':
+            i += 2
+        elif source[i] == quote or source[i] == '\n':
+            return i + 1
+        else:
+            i += 1
+    return i
+
+
+def _skip_regex(source, start):
+    """Return the index just past the regex literal (and flags) starting at start."""
+    i, in_class = start + 1, False
+    while i < len(source) and source[i] != '\n':
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < len(source) and _JS_WORD.match(source[i]):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+# --- Critical CSS ---
+
+def split_css_blocks(css):
+    """
+    Split a (minified) stylesheet into its top-level statements.
+
+    Returns:
+        list: (prelude, body) tuples; body is None for statements without a
+              block, such as @import or @charset
+    """
+    blocks = []
+    i, n, start = 0, len(css), 0
+    while i < n:
+        c = css[i]
+        if c in '\'"':
+            i = _skip_quoted(css, i, c)
+            continue
+        if c == ';':
+            if css[start:i].strip():
+                blocks.append((css[start:i].strip(), None))
+            start = i + 1
+        elif c == '{':
+            depth, j = 1, i + 1
+            while j < n and depth:
+                if css[j] in '\'"':
+                    j = _skip_quoted(css, j, css[j])
+                    continue
+                depth += {'{': 1, '}': -1}.get(css[j], 0)
+                j += 1
+            blocks.append((css[start:i].strip(), css[i + 1:j - 1]))
+            i = start = j
+            continue
+        i += 1
+    return blocks
+
+
+def used_selectors(html):
+    """Collect the tag names, classes and ids that appear in an HTML fragment."""
+    tags = {tag.lower() for tag in re.findall(r'<([a-zA-Z][\w-]*)', html)} | {'html', 'body'}
+    classes = set()
+    for value in re.findall(r'\bclass="([^"]*)"', html):
+        classes.update(token for token in value.split() if re.fullmatch(r'[\w-]+', token))
+    ids = set(re.findall(r'\bid="([\w-]+)"', html))
+    return tags, classes, ids
+
+
+# Selectors that only apply after the first render (interaction states,
+# text selection, scrollbars), so critical CSS can leave them out
+_DEFERRED_PSEUDO = re.compile(r'::?(?:hover|focus(?:-visible|-within)?|active|visited|target|selection|'
+                              r'placeholder|-(?:webkit|moz)-[\w-]+)(?![\w-])')
+
+
+def _selector_used(selector, used):
+    tags, classes, ids = used
+    simple = re.sub(r'\[[^\]]*\]|::?[\w-]+(\([^)]*\))?', '', selector)
+    return (set(re.findall(r'\.([\w-]+)', simple)) <= classes and
+            set(re.findall(r'#([\w-]+)', simple)) <= ids and
+            {tag.lower() for tag in re.findall(r'(?:^|[\s>+~])([a-zA-Z][\w-]*)', simple)} <= tags)
+
+
+def _critical_rules(css, used, wrappers=()):
+    """Yield (enclosing @media/@supports preludes, rule) for the rules used above the fold."""
+    for prelude, body in split_css_blocks(css):
+        if body is None:
+            if prelude.startswith(('@charset', '@import')) and not wrappers:
+                yield wrappers, prelude + ';'
+        elif prelude.startswith(('@media', '@supports')):
+            if not re.match(r'@media\s+print\b', prelude):
+                yield from _critical_rules(body, used, wrappers + (prelude,))
+        elif re.match(r'@(-\w+-)?keyframes', prelude):
+            yield wrappers, f"{prelude}{{{body}}}"
+        elif body and not prelude.startswith('@'):
+            selectors = [selector for selector in prelude.split(',')
+                         if not _DEFERRED_PSEUDO.search(selector) and _selector_used(selector, used)]
+            if selectors:
+                yield wrappers, f"{','.join(selectors)}{{{body}}}"
+
+
+def _wrap(wrappers, rules):
+    text = ''.join(rules)
+    for prelude in reversed(wrappers):
+        text = f"{prelude}{{{text}}}"
+    return text
+
+
+def extract_critical_css(css, html, max_bytes=None):
+    """
+    Return the rules of css needed to render the given HTML fragment.
+
+    A selector is kept when every class, id and tag in it occurs in the
+    fragment (attribute selectors and pseudo-classes are ignored) and it
+    does not depend on interaction, like :hover or :focus; the other
+    selectors of a kept rule are dropped. @keyframes referenced by kept
+    rules are kept too, and print styles never are.
+
+    With max_bytes, rules are kept in stylesheet order as long as they fit;
+    whatever is left out applies once the full stylesheet has loaded.
+    """
+    used = used_selectors(html)
+    rules, keyframes = [], []
+    for wrappers, rule in _critical_rules(css, used):
+        (keyframes if re.match(r'@(-\w+-)?keyframes', rule) else rules).append((wrappers, rule))
+    kept, size = [], 0
+
+    def keep(wrappers, rule):
+        nonlocal size
+        # Consecutive rules under the same @media share one block
+        grouped = bool(kept) and kept[-1][0] == wrappers
+        cost = len(rule) if grouped else len(_wrap(wrappers, [rule]))
+        if max_bytes is not None and size + cost > max_bytes:
+            return
+        if grouped:
+            kept[-1][1].append(rule)
+        else:
+            kept.append((wrappers, [rule]))
+        size += cost
+
+    for wrappers, rule in rules:
+        keep(wrappers, rule)
+    text = ''.join(_wrap(wrappers, group) for wrappers, group in kept)
+    for wrappers, frames in keyframes:
+        name = frames.split('{', 1)[0].split()[-1]
+        if re.search(r'(?<![\w-])' + re.escape(name) + r'(?![\w-])', text):
+            keep(wrappers, frames)
+    return ''.join(_wrap(wrappers, group) for wrappers, group in kept)
@@ -0,0 +1,269 @@
+import smtplib
+import sqlite3
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import formataddr, formatdate, make_msgid
+
+from database import SQLiteDatabase
+
+
+class Outbox:
+    """Persistent queue of outgoing mail messages in a SQLite file.
+
+    Enqueueing is a single INSERT, so request handlers never wait on a mail
+    server. Messages are claimed by a sender with a lease: a claimed message
+    whose sender died is handed out again once the lease expires, and claims
+    are made inside BEGIN IMMEDIATE so several workers can send from the same
+    outbox without delivering a message twice.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        recipient TEXT NOT NULL,
+        reply_to TEXT,
+        reply_name TEXT,
+        subject TEXT NOT NULL,
+        body TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        last_error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt);
+    """
+
+    def __init__(self, path, lease=120):
+        self.path = path
+        self.lease = lease
+        self.db = SQLiteDatabase(path, self.SCHEMA, row_factory=sqlite3.Row)
+
+    def enqueue(self, recipient, subject, body, reply_to=None, reply_name=None):
+        """Store a message for delivery and return its id."""
+        now = time.time()
+        cursor = self.db.execute(
+            'INSERT INTO outbox (created_at, recipient, reply_to, reply_name, subject, body, next_attempt) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)', (now, recipient, reply_to, reply_name, subject, body, now))
+        return cursor.lastrowid
+
+    def claim(self, limit):
+        """Lease up to limit due messages to the caller, oldest first."""
+        now = time.time()
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                "SELECT * FROM outbox WHERE status IN ('pending', 'sending') AND next_attempt <= ? "
+                "ORDER BY next_attempt, id LIMIT ?", (now, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET status = 'sending', next_attempt = ? WHERE id = ?",
+                             [(now + self.lease, row['id']) for row in rows])
+        return [dict(row) for row in rows]
+
+    def mark_sent(self, message_ids):
+        self.db.executemany(
+            "UPDATE outbox SET status = 'sent', attempts = attempts + 1, last_error = NULL WHERE id = ?",
+            [(message_id,) for message_id in message_ids])
+
+    def release(self, message_ids):
+        """Hand claimed messages back without counting an attempt."""
+        self.db.executemany(
+            "UPDATE outbox SET status = 'pending', next_attempt = ? WHERE id = ?",
+            [(time.time(), message_id) for message_id in message_ids])
+
+    def mark_retry(self, message_id, error, delay):
+        self.db.execute(
+            "UPDATE outbox SET status = 'pending', attempts = attempts + 1, next_attempt = ?, last_error = ? "
+            "WHERE id = ?", (time.time() + delay, error, message_id))
+
+    def mark_failed(self, message_id, error):
+        self.db.execute(
+            "UPDATE outbox SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE id = ?",
+            (error, message_id))
+
+    def next_due(self):
+        """Timestamp of the next message due for delivery, or None."""
+        row = self.db.execute(
+            "SELECT MIN(next_attempt) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()
+        return row[0]
+
+    def counts(self):
+        """Number of messages per status."""
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall())
+
+
+class MailSender:
+    """Background thread that delivers Outbox messages over SMTP.
+
+    One SMTP connection is kept open and reused for every batch; it is
+    checked with NOOP after ``idle_check`` seconds of inactivity and closed
+    after ``idle_timeout`` seconds without mail. Failed deliveries are
+    retried with exponential backoff (``retry_base`` seconds, doubling up to
+    ``retry_max``) until ``max_attempts``; 5xx rejections fail immediately.
+
+    Args:
+        outbox (Outbox): Queue to deliver from
+        host, port (str, int): SMTP server
+        security (str): 'starttls', 'ssl' or 'none'
+        username, password (str): Credentials, if the server needs them
+        sender (str): From address
+    """
+
+    def __init__(self, outbox, host, port=587, security='starttls', username=None, password=None,
+                 sender=None, batch_size=20, idle_check=10, idle_timeout=60, timeout=30,
+                 retry_base=30, retry_max=3600, max_attempts=8):
+        self.outbox = outbox
+        self.host = host
+        self.port = port
+        self.security = security
+        self.username = username
+        self.password = password
+        self.sender = sender or username
+        self.batch_size = batch_size
+        self.idle_check = idle_check
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+        self._connection = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout)
+        self._disconnect()
+
+    def wake(self):
+        """Tell the sender new mail was queued."""
+        self._wake.set()
+
+    # --- SMTP connection ---
+
+    def _connect(self):
+        if self.security == 'ssl':
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.security == 'starttls':
+                connection.starttls()
+            if self.username:
+                connection.login(self.username, self.password)
+        except BaseException:
+            connection.close()
+            raise
+        return connection
+
+    def _get_connection(self):
+        if self._connection is not None and time.monotonic() - self._last_used > self.idle_check:
+            try:
+                if self._connection.noop()[0] != 250:
+                    raise smtplib.SMTPServerDisconnected()
+            except (smtplib.SMTPException, OSError):
+                self._disconnect()
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def _disconnect(self, polite=True):
+        """Close the connection, saying QUIT first unless it is known to be broken."""
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        if polite:
+            try:
+                connection.quit()  # closes the socket too
+                return
+            except (smtplib.SMTPException, OSError):
+                pass
+        connection.close()
+
+    # --- Delivery ---
+
+    def build_message(self, message):
+        mail = MIMEMultipart()
+        mail['From'] = self.sender
+        mail['To'] = message['recipient']
+        mail['Subject'] = message['subject']
+        mail['Date'] = formatdate(message['created_at'], localtime=True)
+        mail['Message-ID'] = make_msgid(f"outbox{message['id']}")
+        if message['reply_to']:
+            mail['Reply-To'] = formataddr((message['reply_name'] or '', message['reply_to']))
+        mail.attach(MIMEText(message['body'], 'plain', 'utf-8'))
+        return mail
+
+    def _retry_or_fail(self, message, error):
+        permanent = (isinstance(error, smtplib.SMTPRecipientsRefused) or
+                     (isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600))
+        if permanent or message['attempts'] + 1 >= self.max_attempts:
+            self.outbox.mark_failed(message['id'], str(error))
+        else:
+            delay = min(self.retry_max, self.retry_base * 2 ** message['attempts'])
+            self.outbox.mark_retry(message['id'], str(error), delay)
+
+    def send_batch(self):
+        """Deliver one batch of due messages; returns how many were claimed."""
+        messages = self.outbox.claim(self.batch_size)
+        if not messages:
+            return 0
+        sent = []
+        try:
+            try:
+                connection = self._get_connection()
+            except (smtplib.SMTPException, OSError) as e:
+                for message in messages:
+                    self._retry_or_fail(message, e)
+                return len(messages)
+            for index, message in enumerate(messages):
+                try:
+                    connection.send_message(self.build_message(message))
+                    sent.append(message['id'])
+                except smtplib.SMTPServerDisconnected as e:
+                    self._abandon_connection(e, messages[index:])
+                    break
+                except smtplib.SMTPException as e:
+                    self._retry_or_fail(message, e)
+                except OSError as e:
+                    # A socket error can leave the session mid-command, so it is not reused
+                    self._abandon_connection(e, messages[index:])
+                    break
+                except Exception as e:
+                    # A message that cannot even be built (e.g. a malformed header) never will be
+                    self.outbox.mark_failed(message['id'], f"{e.__class__.__name__}: {e}")
+            self._last_used = time.monotonic()
+        finally:
+            # Delivered messages must never be claimed and sent again
+            self.outbox.mark_sent(sent)
+        return len(messages)
+
+    def _abandon_connection(self, error, messages):
+        """Drop a broken connection mid-batch; messages[0] failed, the rest were never tried."""
+        self._disconnect(polite=False)
+        self._retry_or_fail(messages[0], error)
+        self.outbox.release([message['id'] for message in messages[1:]])
+
+    def _run(self):
+        while not self._stop:
+            try:
+                claimed = self.send_batch()
+            except Exception:
+                claimed = 0  # keep the sender alive; the lease puts messages back in the queue
+            if claimed:
+                continue
+            due = self.outbox.next_due()
+            wait = self.idle_timeout if due is None else max(0.0, due - time.time())
+            if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self._disconnect()
+            self._wake.wait(min(wait, self.idle_timeout))
+            self._wake.clear()
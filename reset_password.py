@@ -1,18 +1,17 @@
-import json
+import os
 from werkzeug.security import generate_password_hash
+from storage import open_store
 
 JSON_FILE = 'data/data.json'
+SQLITE_FILE = 'data/portfolio.db'
 
 def reset_password():
     try:
-        with open(JSON_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
         new_hash = generate_password_hash('admin123', method='pbkdf2:sha256')
-        data['admin_credentials']['password_hash'] = new_hash
-        
-        with open(JSON_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        store = open_store(os.environ.get('PORTFOLIO_STORAGE', 'json'), JSON_FILE, SQLITE_FILE,
+                           os.environ.get('PORTFOLIO_DATA_FORMAT', 'pretty'))
+        with store.transaction() as data:
+            data['admin_credentials']['password_hash'] = new_hash
         
         print(f"Password reset to 'admin123'. New hash: {new_hash}")
     except Exception as e:
@@ -1,12 +1,4 @@
 document.addEventListener('DOMContentLoaded', function () {
-    // --- Cache Refresh ---
-    const links = document.querySelectorAll('link[rel="stylesheet"]');
-    links.forEach(link => {
-        if (link.href.indexOf('?') === -1) {
-            link.href += '?v=' + Date.now();
-        }
-    });
-
     // --- Flash Messages Auto-hide ---
     const alerts = document.querySelectorAll('.flash-messages-container .alert');
     alerts.forEach(alert => {
@@ -97,6 +89,25 @@ document.addEventListener('DOMContentLoaded', function () {
         });
     }
 
+    // --- Background Image Processing Status ---
+    const jobStatus = document.getElementById('imageJobStatus');
+    if (jobStatus && ['queued', 'running'].includes(jobStatus.dataset.status)) {
+        const pollJob = setInterval(() => {
+            fetch(jobStatus.dataset.statusUrl, { credentials: 'same-origin' })
+                .then(response => response.ok ? response.json() : Promise.reject(response.status))
+                .then(job => {
+                    if (job.status === 'done' || job.status === 'failed') {
+                        clearInterval(pollJob);
+                        window.location.reload();
+                    }
+                })
+                .catch(status => {
+                    // Keep polling through network hiccups; stop once the job is unknown
+                    if (status === 404) clearInterval(pollJob);
+                });
+        }, 1500);
+    }
+
     // --- Drag-and-Drop for Skills ---
     setupDragAndDrop('skills-table', 'saveSkillsOrderBtn', 'reorder_skills');
 
@@ -204,7 +204,7 @@ function initializeMobileMenu() {
 async function initializeTheme() {
   try {
     // Always fetch the latest settings from server first
-    const response = await fetch('/api/portfolio_data');
+    const response = await fetch('/api/settings');
     if (response.ok) {
       const data = await response.json();
       const serverTheme = data.settings?.default_theme || 'Default Dark';
@@ -254,32 +254,36 @@ async function initializeTheme() {
 initializeTheme();
 
 // Function to check for server-side theme changes
-async function checkForThemeChanges() {
+async function checkForThemeChanges(settings) {
   try {
-    const response = await fetch('/api/portfolio_data');
-    if (response.ok) {
-      const data = await response.json();
-      const serverTheme = data.settings?.default_theme || 'Default Dark';
-
-      // Convert server theme setting to mode
-      let serverThemeMode = 'dark';
-      if (serverTheme.includes('Light')) {
-        serverThemeMode = 'light';
-      } else if (serverTheme.includes('Dark')) {
-        serverThemeMode = 'dark';
+    // Settings arrive with change events; otherwise fetch them
+    if (!settings) {
+      const response = await fetch('/api/settings', { cache: 'no-cache' });
+      if (!response.ok) {
+        return;
       }
+      settings = (await response.json()).settings;
+    }
+    const serverTheme = settings?.default_theme || 'Default Dark';
+
+    // Convert server theme setting to mode
+    let serverThemeMode = 'dark';
+    if (serverTheme.includes('Light')) {
+      serverThemeMode = 'light';
+    } else if (serverTheme.includes('Dark')) {
+      serverThemeMode = 'dark';
+    }
 
-      const savedTheme = localStorage.getItem("theme");
+    const savedTheme = localStorage.getItem("theme");
 
-      // If server theme is different from current theme, update it
-      if (savedTheme !== serverThemeMode) {
-        console.log('Theme change detected: server =', serverThemeMode, 'current =', savedTheme);
-        setThemeMode(serverThemeMode === 'dark'); // Pass boolean for setThemeMode
-        localStorage.setItem("theme", serverThemeMode);
+    // If server theme is different from current theme, update it
+    if (savedTheme !== serverThemeMode) {
+      console.log('Theme change detected: server =', serverThemeMode, 'current =', savedTheme);
+      setThemeMode(serverThemeMode === 'dark'); // Pass boolean for setThemeMode
+      localStorage.setItem("theme", serverThemeMode);
 
-        // Show notification to user
-        showThemeChangeNotification(serverThemeMode);
-      }
+      // Show notification to user
+      showThemeChangeNotification(serverThemeMode);
     }
   } catch (error) {
     console.error('Error checking for theme changes:', error);
@@ -350,8 +354,31 @@ function showThemeChangeNotification(themeMode) {
   }, 5000);
 }
 
-// Check for theme changes every 30 seconds
-setInterval(checkForThemeChanges, 30000);
+// Follow settings changes. By default the small settings endpoint is polled
+// (revalidated with its ETag, so unchanged settings cost a 304); the server
+// only pushes changes over /api/events when it runs with the event stream on.
+function watchForSettingsChanges() {
+  const mode = document.body.dataset.settingsWatch;
+  if (mode === 'events' && window.EventSource) {
+    const events = new EventSource('/api/events');
+    events.addEventListener('change', (event) => {
+      try {
+        checkForThemeChanges(JSON.parse(event.data).settings);
+      } catch (error) {
+        console.error('Error handling settings change:', error);
+      }
+    });
+    return;
+  }
+  const interval = (parseInt(document.body.dataset.settingsPoll, 10) || 300) * 1000;
+  setInterval(() => {
+    if (!document.hidden) {
+      checkForThemeChanges();
+    }
+  }, interval);
+}
+
+watchForSettingsChanges();
 
 // Also check when the page becomes visible (user switches back to tab)
 document.addEventListener('visibilitychange', () => {
@@ -689,6 +716,14 @@ function initializeScrollSpy() {
 
 // Enhanced portfolio data loading with better error handling
 async function fetchAndRenderPortfolioData() {
+  // Sections were already rendered into the page by the server
+  if (document.body.dataset.prerendered === 'true') {
+    await initializeTheme();
+    initializeScrollAnimations();
+    hideLoading();
+    return;
+  }
+
   showLoading();
 
   try {
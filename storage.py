@@ -0,0 +1,858 @@
+import contextlib
+import hashlib
+import json
+import os
+import stat
+import struct
+import tempfile
+import threading
+import zlib
+
+from database import SQLiteDatabase
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import msgpack
+except ImportError:  # optional, binary files fall back to zlib-compressed JSON
+    msgpack = None
+
+# On-disk encodings understood by the store:
+#   pretty  - indented JSON, easy to read and diff (the historical default)
+#   compact - JSON without whitespace
+#   binary  - BINARY_MAGIC + codec byte + 4-byte big-endian length + payload,
+#             where the payload is msgpack ('M') if available, otherwise
+#             zlib-compressed compact JSON ('Z')
+FORMATS = ('pretty', 'compact', 'binary')
+BINARY_MAGIC = b'PFD\x00'
+_BINARY_HEADER = struct.Struct('>4scI')
+
+
+def encode_document(data, fmt='pretty'):
+    """Serialize the document to bytes in the given on-disk format."""
+    if fmt == 'pretty':
+        return json.dumps(data, indent=4, ensure_ascii=False).encode('utf-8')
+    if fmt == 'compact':
+        return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if fmt == 'binary':
+        if msgpack is not None:
+            codec, payload = b'M', msgpack.packb(data, use_bin_type=True)
+        else:
+            codec, payload = b'Z', zlib.compress(encode_document(data, 'compact'), 6)
+        return _BINARY_HEADER.pack(BINARY_MAGIC, codec, len(payload)) + payload
+    raise ValueError(f"Unknown data format: {fmt!r}")
+
+
+def decode_document(raw):
+    """Parse bytes written by encode_document(), whatever their format."""
+    if raw.startswith(BINARY_MAGIC):
+        _, codec, length = _BINARY_HEADER.unpack_from(raw)
+        payload = raw[_BINARY_HEADER.size:_BINARY_HEADER.size + length]
+        if len(payload) != length:
+            raise ValueError('Binary data file is truncated')
+        if codec == b'M':
+            if msgpack is None:
+                raise ValueError('Binary data file was written with msgpack, which is not installed')
+            return msgpack.unpackb(payload, raw=False)
+        if codec == b'Z':
+            return json.loads(zlib.decompress(payload))
+        raise ValueError(f"Unknown binary codec: {codec!r}")
+    text = raw.decode('utf-8-sig')
+    return json.loads(text) if text.strip() else {}
+
+
+def detect_format(raw):
+    """Guess which of FORMATS the given file contents were written in."""
+    if raw.startswith(BINARY_MAGIC):
+        return 'binary'
+    return 'pretty' if b'\n' in raw.strip() else 'compact'
+
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError(f"'{type(self).__name__}' object is read-only")
+
+
+class FrozenDict(dict):
+    """A dict that refuses in-place modification.
+
+    It is still a real dict, so Jinja templates and jsonify() handle it like
+    any other mapping. copy() and copy.deepcopy() return plain, mutable
+    objects, which makes copy-on-write as simple as ``dict(frozen, key=...)``.
+    """
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def copy(self):
+        return dict(self)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class FrozenList(list):
+    """A list that refuses in-place modification. See FrozenDict."""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def copy(self):
+        return list(self)
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def freeze(value):
+    """Recursively convert parsed JSON into FrozenDict/FrozenList values."""
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    return value
+
+
+def thaw(value):
+    """Recursively convert frozen values back into plain dicts and lists."""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
+
+
+def _fsync_directory(directory):
+    """Flush a rename to disk. Not supported on every platform."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def content_hash(value):
+    """Return a short, stable hash of a JSON-compatible value."""
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()[:16]
+
+
+class PortfolioIndex:
+    """Lookup tables over the portfolios of one snapshot.
+
+    Built once whenever a store loads a new snapshot, so finding a portfolio
+    by id or name, or finding the active one, is a dict lookup instead of a
+    scan over ``data['portfolios']``. Positions refer to the portfolio list
+    of that same snapshot, and therefore also to fresh copies of it.
+
+    It also records content versions: short hashes of the whole document,
+    of each portfolio and of the site settings. Unlike BaseStore.version
+    they are the same in every worker process, so they can key caches and
+    HTTP validators.
+
+    ``data`` is the snapshot the index was built from. Code that needs both
+    the document and its versions should take them from one index, so a
+    reload in between cannot pair new content with an old version.
+
+    Given the ``previous`` index, portfolios equal to the ones it saw keep
+    their hash instead of being serialized and hashed again, so a write
+    that touched one portfolio only rehashes that one. The document version
+    is derived from the portfolio hashes plus the rest of the document.
+    """
+
+    def __init__(self, data, previous=None):
+        self.data = data
+        self.settings = data.get('settings', {})
+        self.settings_version = content_hash(self.settings)
+        self.versions = {}
+        self.by_id = {}
+        self.positions = {}
+        self.by_name = {}
+        self.active = None
+        self.active_position = None
+        portfolio_versions = []
+        for position, portfolio in enumerate(data.get('portfolios', [])):
+            portfolio_id = portfolio.get('id')
+            portfolio_version = self._portfolio_version(portfolio, previous)
+            portfolio_versions.append(portfolio_version)
+            if portfolio_id not in self.by_id:
+                self.by_id[portfolio_id] = portfolio
+                self.positions[portfolio_id] = position
+                self.versions[portfolio_id] = portfolio_version
+            name = portfolio.get('name')
+            if isinstance(name, str):
+                self.by_name.setdefault(name.casefold(), portfolio)
+            if self.active is None and portfolio.get('is_active', False):
+                self.active = portfolio
+                self.active_position = position
+        rest = {key: value for key, value in data.items() if key != 'portfolios'}
+        self.document_version = content_hash([rest, portfolio_versions])
+
+    @staticmethod
+    def _portfolio_version(portfolio, previous):
+        if previous is not None:
+            old = previous.by_id.get(portfolio.get('id'))
+            if old is portfolio or (old is not None and old == portfolio):
+                return previous.versions[portfolio.get('id')]
+        return content_hash(portfolio)
+
+    def name_taken(self, name):
+        """Return True if a portfolio already uses this name (case-insensitive)."""
+        return name.casefold() in self.by_name
+
+
+def acquire_file_lock(lock_path):
+    """
+    Block until this process holds an exclusive lock on lock_path.
+
+    The lock is an flock() (or msvcrt lock) on a sidecar file, so it excludes
+    other processes as well as other threads that open the file themselves.
+
+    Returns:
+        file: The open lock file, to pass to release_file_lock()
+    """
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    f = open(lock_path, 'a+b')
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def release_file_lock(f):
+    """Release a lock taken with acquire_file_lock() and close its file."""
+    try:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """Hold an exclusive lock on lock_path for the duration of the block (not re-entrant)."""
+    f = acquire_file_lock(lock_path)
+    try:
+        yield
+    finally:
+        release_file_lock(f)
+
+
+class BaseStore:
+    """Common behaviour of the portfolio document stores.
+
+    Every backend keeps an in-process copy of the document and only reloads
+    it when the underlying storage changed. snapshot() returns that copy as a
+    frozen value that is shared between all callers and concurrent requests;
+    attempts to modify it raise TypeError. Use load_copy() when the document
+    is going to be modified and handed back to write().
+
+    Read-modify-write cycles should run inside transaction() (or locked()),
+    which holds an exclusive lock on a sidecar ``.lock`` file so concurrent
+    admin requests in different workers cannot lose each other's changes.
+    Readers never take that lock.
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self.version = 0
+        # Unix time of the last change to the underlying storage, if known
+        self.modified_at = None
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._data = None
+        self._index = PortfolioIndex({})
+        self._write_lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """Call ``callback(store)`` whenever a new snapshot is loaded.
+
+        Callbacks run while the store's internal lock is held and should only
+        do quick bookkeeping such as dropping caches.
+        """
+        self._subscribers.append(callback)
+
+    def _refresh(self):
+        """Reload the cached document if the underlying storage changed."""
+        raise NotImplementedError
+
+    def _publish(self, data, stamp, modified_at=None):
+        """Install a freshly loaded snapshot and its lookup index."""
+        self._index = PortfolioIndex(data, self._index)
+        self.modified_at = modified_at
+        self._data = data
+        self._stamp = stamp
+        self.version += 1
+        for callback in self._subscribers:
+            callback(self)
+
+    def snapshot(self):
+        """Return the shared, read-only snapshot of the document."""
+        self._refresh()
+        return self._data
+
+    def index(self):
+        """Return the PortfolioIndex of the current snapshot."""
+        self._refresh()
+        return self._index
+
+    def load_copy(self):
+        """Return a private copy of the document that the caller may modify."""
+        raise NotImplementedError
+
+    def write(self, data):
+        """Persist the document and refresh or drop the cached copy."""
+        raise NotImplementedError
+
+    def invalidate(self):
+        """Forget the cached document so the next read reloads it."""
+        with self._lock:
+            self._stamp = None
+
+    def _acquire_file_lock(self):
+        self._lock_file = acquire_file_lock(self.lock_path)
+
+    def _release_file_lock(self):
+        f, self._lock_file = self._lock_file, None
+        release_file_lock(f)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Hold the single-writer lock for the duration of the block.
+
+        The lock is re-entrant within a thread, so helpers that write on their
+        own can be called from inside a larger locked section.
+        """
+        with self._write_lock:
+            if self._lock_depth == 0:
+                self._acquire_file_lock()
+                # Another process may have written just before we got the
+                # lock. Re-check the file stamp (or revision) now; the cached
+                # snapshot is only reloaded, and subscribers only told, if
+                # storage actually changed.
+                self._refresh()
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    self._release_file_lock()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Yield a modifiable copy of the document and write it back on success."""
+        with self.locked():
+            data = self.load_copy()
+            yield data
+            self.write(data)
+
+
+class DocumentStore(BaseStore):
+    """Portfolio document kept in a single JSON (or binary) file.
+
+    The file is parsed once per change. Every read stats the file and only
+    re-parses it when (mtime_ns, size, inode) differ from the cached copy, so
+    edits made by other workers or by hand are picked up on the next request.
+    Writes that go through the store invalidate the cache immediately.
+
+    Writes are atomic: the document is written to a temporary file in the
+    same directory, fsync'd and renamed over the original, so readers in any
+    process see either the old or the new document, never a truncated one.
+
+    ``fmt`` selects the encoding used for writes (see FORMATS); reads detect
+    the format of whatever is on disk.
+    """
+
+    def __init__(self, path, fmt='pretty'):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown data format: {fmt!r}")
+        super().__init__(path + '.lock')
+        self.path = path
+        self.format = fmt
+        self._raw = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _refresh(self):
+        stamp = self._stat()
+        if stamp is not None and stamp == self._stamp:
+            return
+        with self._lock:
+            stamp = self._stat()
+            if stamp is not None and stamp == self._stamp:
+                return
+            if stamp is None:
+                raw, data = None, FrozenDict()
+            else:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                data = freeze(decode_document(raw))
+                # The file may have been replaced while we were reading it;
+                # take the stamp again so a torn read is retried next time.
+                if self._stat() != stamp:
+                    stamp = None
+            self._raw = raw
+            self._publish(data, stamp, stamp[0] / 1e9 if stamp else None)
+
+    def load_copy(self):
+        self._refresh()
+        raw = self._raw
+        if raw is None:
+            return {}
+        return decode_document(raw)
+
+    def write(self, data):
+        """Atomically replace the document on disk and drop the cached copy."""
+        directory = os.path.dirname(self.path) or '.'
+        with self.locked():
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(self.path) + '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(encode_document(data, self.format))
+                    f.flush()
+                    os.fsync(f.fileno())
+                try:
+                    mode = stat.S_IMODE(os.stat(self.path).st_mode)
+                except FileNotFoundError:
+                    mode = 0o644
+                os.chmod(tmp_path, mode)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(tmp_path)
+                raise
+            _fsync_directory(directory)
+            self.invalidate()
+
+
+def _dump_row(value):
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _is_ref(value, kind):
+    return isinstance(value, dict) and len(value) == 1 and kind in value
+
+
+def _split_portfolio(portfolio):
+    """Split a portfolio into row bodies: (body, {section path: body}, {list path: items})."""
+    body, sections, lists = {}, {}, {}
+    for key, value in portfolio.items():
+        if isinstance(value, list):
+            body[key] = {'$items': key}
+            lists[key] = value
+        elif isinstance(value, dict):
+            body[key] = {'$section': key}
+            section = {}
+            for sub_key, sub_value in value.items():
+                if isinstance(sub_value, list):
+                    path = f"{key}.{sub_key}"
+                    section[sub_key] = {'$items': path}
+                    lists[path] = sub_value
+                else:
+                    section[sub_key] = sub_value
+            sections[key] = section
+        else:
+            body[key] = value
+    return body, sections, lists
+
+
+def _match_items(old, new):
+    """For each element of new, the index of an equal, not yet matched element of old (or None)."""
+    matches = [None] * len(new)
+    # Most edits touch one spot: match the common prefix and suffix first
+    start = 0
+    while start < len(old) and start < len(new) and old[start] == new[start]:
+        matches[start] = start
+        start += 1
+    end = 0
+    while end < len(old) - start and end < len(new) - start and old[-1 - end] == new[-1 - end]:
+        matches[len(new) - 1 - end] = len(old) - 1 - end
+        end += 1
+    unused = list(range(start, len(old) - end))
+    for i in range(start, len(new) - end):
+        for k, j in enumerate(unused):
+            if old[j] == new[i]:
+                matches[i] = j
+                del unused[k]
+                break
+    return matches
+
+
+def _in_order(matches):
+    """Indexes i of the longest run of matches[i] that is increasing (None entries skipped)."""
+    tails, previous = [], {}
+    for i, match in enumerate(matches):
+        if match is None:
+            continue
+        low, high = 0, len(tails)
+        while low < high:
+            middle = (low + high) // 2
+            if matches[tails[middle]] < match:
+                low = middle + 1
+            else:
+                high = middle
+        previous[i] = tails[low - 1] if low else None
+        if low == len(tails):
+            tails.append(i)
+        else:
+            tails[low] = i
+    run = set()
+    i = tails[-1] if tails else None
+    while i is not None:
+        run.add(i)
+        i = previous[i]
+    return run
+
+
+def _between(low, high, count):
+    """count increasing sort positions strictly between low and high (None: unbounded)."""
+    if low is None and high is None:
+        return list(range(count))
+    if high is None:
+        return [low + 1 + j for j in range(count)]
+    if low is None:
+        return [high - count + j for j in range(count)]
+    step = (high - low) / (count + 1)
+    return [low + step * (j + 1) for j in range(count)]
+
+
+def _place(old_positions, matches, reuse=False):
+    """
+    Choose sort positions for the rows of a list that changed.
+
+    Rows whose element is still present and still in order keep their
+    position, so deleting or inserting one element never moves the others.
+    Every other element gets a fresh position between its neighbours, or
+    with ``reuse``, the position of an unmatched old row in the same gap
+    (an in-place edit then updates that row instead of replacing it).
+
+    Returns:
+        tuple: (positions, sources) where sources[i] is the old index whose
+               position element i took, or None for a fresh position; None
+               instead if the gaps ran out of floating point precision
+    """
+    count = len(matches)
+    positions, sources = [None] * count, [None] * count
+    anchors = sorted(_in_order(matches))
+    for i in anchors:
+        positions[i], sources[i] = old_positions[matches[i]], matches[i]
+    previous_new, previous_old = -1, -1
+    for anchor in anchors + [count]:
+        gap = range(previous_new + 1, anchor)
+        next_old = matches[anchor] if anchor < count else len(old_positions)
+        free = list(range(previous_old + 1, next_old)) if reuse else []
+        low = old_positions[previous_old] if previous_old >= 0 else None
+        for i, j in zip(gap, free):
+            positions[i], sources[i], low = old_positions[j], j, old_positions[j]
+        fresh = gap[len(free):]
+        high = old_positions[next_old] if next_old < len(old_positions) else None
+        for i, position in zip(fresh, _between(low, high, len(fresh))):
+            positions[i] = position
+        if anchor < count:
+            previous_new, previous_old = anchor, matches[anchor]
+    if any(a >= b for a, b in zip(positions, positions[1:])):
+        return None
+    return positions, sources
+
+
+def _share(old, new):
+    """Freeze new, reusing the frozen values of old that are equal to its parts."""
+    if isinstance(new, dict):
+        if not isinstance(old, dict):
+            return freeze(new)
+        if old == new:
+            return old
+        return FrozenDict((key, _share(old.get(key), value)) for key, value in new.items())
+    if isinstance(new, list):
+        if not isinstance(old, list):
+            return freeze(new)
+        if old == new:
+            return old
+        return FrozenList(freeze(item) if match is None else old[match]
+                          for item, match in zip(new, _match_items(old, new)))
+    return new
+
+
+class SQLiteStore(BaseStore):
+    """Portfolio document stored as rows in a SQLite database (WAL mode).
+
+    The document is split into rows so that an edit rewrites only what
+    changed instead of the whole site:
+
+    * ``meta``: every top-level key other than ``portfolios`` (credentials,
+      settings, legacy root sections), one row per key.
+    * ``portfolios``: one row per portfolio holding its scalar fields.
+    * ``sections``: one row per dict-valued field of a portfolio
+      (``about``, ``contact``, ``skills``, ...) holding its scalar fields.
+    * ``items``: one row per element of every list, addressed by portfolio,
+      path (``projects``, ``skills.technical``, ``about.hero_buttons``, ...)
+      and position.
+
+    Nested rows are referenced from their parent with ``{"$section": path}``
+    and ``{"$items": path}`` markers. Positions of portfolios and list items
+    are sort keys rather than indexes: they are never renumbered, and an
+    element inserted between two others gets a position in between, so
+    adding, editing or deleting one skill or project writes a single row.
+
+    write() still accepts the whole document, but compares it with the
+    current snapshot, skipping unchanged portfolios and lists with a plain
+    equality test, and only serializes the rows that differ. The new
+    snapshot reuses the frozen parts of the previous one that did not
+    change. A ``revision`` counter bumped by every write lets each worker
+    notice changes made by other processes with one cheap query per request.
+
+    JSON files remain the import/export format: an empty database is seeded
+    from ``import_path`` on first use, and snapshot() can be serialized with
+    encode_document() at any time.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS revision (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO revision (id, value) VALUES (0, 0);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS portfolios (
+            id TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS sections (
+            portfolio_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            body TEXT NOT NULL,
+            PRIMARY KEY (portfolio_id, path)
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            portfolio_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            body TEXT NOT NULL,
+            PRIMARY KEY (portfolio_id, path, position)
+        );
+    """
+
+    def __init__(self, path, import_path=None):
+        super().__init__(path + '.lock')
+        self.path = path
+        self.db = SQLiteDatabase(path, self.SCHEMA)
+        # Stored positions, in snapshot order, of the portfolios and of the
+        # items of every list, keyed by (portfolio id, path)
+        self._portfolio_positions = []
+        self._item_positions = {}
+        conn = self.db.connection()
+        if import_path and os.path.exists(import_path):
+            with self.locked():
+                if not conn.execute('SELECT 1 FROM meta LIMIT 1').fetchone():
+                    with open(import_path, 'rb') as f:
+                        self.write(decode_document(f.read()))
+
+    def _modified_time(self):
+        """Return the newest mtime of the database and its write-ahead log."""
+        times = []
+        for path in (self.path, self.path + '-wal'):
+            with contextlib.suppress(FileNotFoundError):
+                times.append(os.stat(path).st_mtime)
+        return max(times) if times else None
+
+    def _revision(self):
+        return self.db.execute('SELECT value FROM revision WHERE id = 0').fetchone()[0]
+
+    def _load(self, conn):
+        """Read the whole document, plus the stored positions of its portfolios and list items."""
+        sections = {(pid, path): body for pid, path, body in
+                    conn.execute('SELECT portfolio_id, path, body FROM sections')}
+        items = {}
+        for pid, path, position, body in conn.execute(
+                'SELECT portfolio_id, path, position, body FROM items ORDER BY portfolio_id, path, position'):
+            items.setdefault((pid, path), []).append((position, body))
+        item_positions = {}
+
+        def resolve(pid, value):
+            if _is_ref(value, '$items'):
+                rows = items.get((pid, value['$items']), [])
+                item_positions[pid, value['$items']] = [position for position, _ in rows]
+                return [json.loads(body) for _, body in rows]
+            if _is_ref(value, '$section'):
+                section = json.loads(sections.get((pid, value['$section']), '{}'))
+                return {k: resolve(pid, v) for k, v in section.items()}
+            return value
+
+        data, portfolio_positions = {}, []
+        for key, body in conn.execute('SELECT key, body FROM meta ORDER BY position'):
+            if key != 'portfolios':
+                data[key] = json.loads(body)
+                continue
+            data[key] = []
+            for pid, position, pbody in conn.execute('SELECT id, position, body FROM portfolios ORDER BY position'):
+                data[key].append({k: resolve(pid, v) for k, v in json.loads(pbody).items()})
+                portfolio_positions.append(position)
+        return data, portfolio_positions, item_positions
+
+    def _refresh(self):
+        revision = self._revision()
+        if revision == self._stamp:
+            return
+        with self._lock:
+            if revision == self._stamp:
+                return
+            conn = self.db.connection()
+            conn.execute('BEGIN')
+            try:
+                revision = conn.execute('SELECT value FROM revision WHERE id = 0').fetchone()[0]
+                data, self._portfolio_positions, self._item_positions = self._load(conn)
+            finally:
+                conn.execute('COMMIT')
+            self._publish(freeze(data), revision, self._modified_time())
+
+    def load_copy(self):
+        return thaw(self.snapshot())
+
+    def write(self, data):
+        """Persist only the rows that differ from the current snapshot."""
+        ids = [portfolio.get('id') for portfolio in data.get('portfolios', [])]
+        if not all(isinstance(pid, str) for pid in ids) or len(set(ids)) != len(ids):
+            raise ValueError(f"Every portfolio needs a unique string id (got {ids!r})")
+        with self.locked():
+            self._refresh()
+            old = self._data
+            item_positions = dict(self._item_positions)
+            with self.db.transaction() as conn:
+                self._write_meta(conn, old, data)
+                portfolio_positions = self._write_portfolios(conn, old.get('portfolios', []),
+                                                             data.get('portfolios', []), item_positions)
+                conn.execute('UPDATE revision SET value = value + 1 WHERE id = 0')
+                revision = conn.execute('SELECT value FROM revision WHERE id = 0').fetchone()[0]
+            snapshot = _share(old, data)
+            with self._lock:
+                self._portfolio_positions = portfolio_positions
+                self._item_positions = item_positions
+                self._publish(snapshot, revision, self._modified_time())
+
+    def _write_meta(self, conn, old, data):
+        old_positions = {key: position for position, key in enumerate(old)}
+        for key in old_positions.keys() - data.keys():
+            conn.execute('DELETE FROM meta WHERE key = ?', (key,))
+        for position, (key, value) in enumerate(data.items()):
+            if old_positions.get(key) == position and (key == 'portfolios' or old[key] == value):
+                continue
+            conn.execute('INSERT OR REPLACE INTO meta (key, position, body) VALUES (?, ?, ?)',
+                         (key, position, 'null' if key == 'portfolios' else _dump_row(value)))
+
+    def _write_portfolios(self, conn, old, new, item_positions):
+        """Write the changed portfolios and return the positions of all of them."""
+        old_index = {portfolio['id']: i for i, portfolio in enumerate(old)}
+        for pid in old_index.keys() - {portfolio['id'] for portfolio in new}:
+            for table, column in (('portfolios', 'id'), ('sections', 'portfolio_id'), ('items', 'portfolio_id')):
+                conn.execute(f'DELETE FROM {table} WHERE {column} = ?', (pid,))
+            for key in [key for key in item_positions if key[0] == pid]:
+                del item_positions[key]
+        matches = [old_index.get(portfolio['id']) for portfolio in new]
+        placed = _place(self._portfolio_positions, matches)
+        positions = placed[0] if placed else list(range(len(new)))
+        for portfolio, match, position in zip(new, matches, positions):
+            previous = old[match] if match is not None else {}
+            moved = match is None or self._portfolio_positions[match] != position
+            if moved or previous != portfolio:
+                self._write_portfolio(conn, portfolio['id'], previous, portfolio, position, moved, item_positions)
+        return positions
+
+    def _write_portfolio(self, conn, pid, old, new, position, moved, item_positions):
+        old_body, old_sections, old_lists = _split_portfolio(old)
+        body, sections, lists = _split_portfolio(new)
+        if moved or body != old_body:
+            conn.execute('INSERT OR REPLACE INTO portfolios (id, position, body) VALUES (?, ?, ?)',
+                         (pid, position, _dump_row(body)))
+        for path in old_sections.keys() - sections.keys():
+            conn.execute('DELETE FROM sections WHERE portfolio_id = ? AND path = ?', (pid, path))
+        for path, section in sections.items():
+            if old_sections.get(path) != section:
+                conn.execute('INSERT OR REPLACE INTO sections (portfolio_id, path, body) VALUES (?, ?, ?)',
+                             (pid, path, _dump_row(section)))
+        for path in old_lists.keys() - lists.keys():
+            conn.execute('DELETE FROM items WHERE portfolio_id = ? AND path = ?', (pid, path))
+            item_positions.pop((pid, path), None)
+        for path, items in lists.items():
+            old_items = old_lists.get(path, [])
+            if old_items != items:
+                item_positions[pid, path] = self._write_items(
+                    conn, pid, path, old_items, items, item_positions.get((pid, path), []))
+
+    def _write_items(self, conn, pid, path, old, new, old_positions):
+        """Write the rows of one changed list and return the positions of its items."""
+        matches = _match_items(old, new)
+        placed = _place(old_positions, matches, reuse=True)
+        if placed is None:
+            # Repeated inserts at one spot used up the gap: renumber this list
+            conn.execute('DELETE FROM items WHERE portfolio_id = ? AND path = ?', (pid, path))
+            conn.executemany('INSERT INTO items (portfolio_id, path, position, body) VALUES (?, ?, ?, ?)',
+                             [(pid, path, position, _dump_row(item)) for position, item in enumerate(new)])
+            return list(range(len(new)))
+        positions, sources = placed
+        for j in set(range(len(old))) - set(sources):
+            conn.execute('DELETE FROM items WHERE portfolio_id = ? AND path = ? AND position = ?',
+                         (pid, path, old_positions[j]))
+        for item, match, position, source in zip(new, matches, positions, sources):
+            if source is None:
+                conn.execute('INSERT INTO items (portfolio_id, path, position, body) VALUES (?, ?, ?, ?)',
+                             (pid, path, position, _dump_row(item)))
+            elif source != match:
+                conn.execute('UPDATE items SET body = ? WHERE portfolio_id = ? AND path = ? AND position = ?',
+                             (_dump_row(item), pid, path, position))
+        return positions
+
+
+def open_store(backend, json_path, sqlite_path=None, fmt='pretty'):
+    """Create the store for the configured backend ('json' or 'sqlite')."""
+    if backend == 'json':
+        return DocumentStore(json_path, fmt)
+    if backend == 'sqlite':
+        return SQLiteStore(sqlite_path or os.path.splitext(json_path)[0] + '.db', import_path=json_path)
+    raise ValueError(f"Unknown storage backend: {backend!r}")
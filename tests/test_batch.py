@@ -0,0 +1,122 @@
+import pytest
+
+from batch import MAX_OPERATIONS, BatchError, apply_operations, describe, validate_operations
+
+
+def portfolio():
+    return {
+        'skills': {'technical': [{'name': 'Python'}, {'name': 'SQL'}]},
+        'projects': [{'title': 'One', 'description': 'First'}],
+        'contact': {'email': 'old@example.com'},
+    }
+
+
+ADD_SKILL = {'op': 'add', 'target': 'skills', 'type': 'technical', 'item': {'name': 'Go'}}
+
+
+def test_valid_operations_have_no_errors():
+    ops = [
+        ADD_SKILL,
+        {'op': 'edit', 'target': 'projects', 'index': 0, 'item': {'technologies': 'a, b'}},
+        {'op': 'delete', 'target': 'experience', 'category': 'thesis', 'index': 0},
+        {'op': 'reorder', 'target': 'hero_buttons', 'order': [1, 0]},
+        {'op': 'edit', 'target': 'contact', 'item': {'email': 'new@example.com'}},
+    ]
+    assert validate_operations(ops) == []
+
+
+@pytest.mark.parametrize('ops', [None, {}, [], 'add'])
+def test_ops_must_be_a_non_empty_list(ops):
+    assert validate_operations(ops) == [{'index': None, 'error': "'ops' must be a non-empty list"}]
+
+
+def test_batch_size_is_limited():
+    errors = validate_operations([ADD_SKILL] * (MAX_OPERATIONS + 1))
+    assert errors == [{'index': None, 'error': f"At most {MAX_OPERATIONS} operations per batch"}]
+
+
+@pytest.mark.parametrize('op, error', [
+    ('add', 'Operation must be an object'),
+    ({'op': 'upsert', 'target': 'skills'}, "'op' must be one of"),
+    ({'op': 'add', 'target': 'hobbies', 'item': {}}, "Unknown target: 'hobbies'"),
+    ({'op': 'delete', 'target': 'contact'}, "Contact details only support 'edit'"),
+    ({'op': 'edit', 'target': 'contact', 'item': {'email': 'not-an-email'}}, "'email' is not a valid email address"),
+    ({'op': 'edit', 'target': 'contact', 'item': {'fax': '123'}}, 'Unknown fields: fax'),
+    ({'op': 'add', 'target': 'skills', 'type': 'magic', 'item': {'name': 'x'}}, "'type' must be one of"),
+    ({'op': 'add', 'target': 'experience', 'item': {'title': 'x'}}, "'category' must be one of"),
+    ({'op': 'edit', 'target': 'projects', 'item': {'title': 'x'}}, "'index' must be a non-negative integer"),
+    ({'op': 'delete', 'target': 'projects', 'index': -1}, "'index' must be a non-negative integer"),
+    ({'op': 'delete', 'target': 'projects', 'index': True}, "'index' must be a non-negative integer"),
+    ({'op': 'delete', 'target': 'projects', 'index': '0'}, "'index' must be a non-negative integer"),
+    ({'op': 'reorder', 'target': 'projects', 'order': '0,1'}, "'order' must be a list of indexes"),
+    ({'op': 'reorder', 'target': 'projects', 'order': [0, False]}, "'order' must be a list of indexes"),
+    ({'op': 'add', 'target': 'projects', 'item': 'x'}, "'item' must be an object"),
+    ({'op': 'add', 'target': 'projects', 'item': {'title': 'x'}}, "'description' is required"),
+    ({'op': 'add', 'target': 'projects', 'item': {'title': 'x', 'description': 'y', 'stars': 3}}, 'Unknown fields: stars'),
+    ({'op': 'edit', 'target': 'projects', 'index': 0, 'item': {'title': '   '}}, "'title' cannot be empty"),
+    ({'op': 'edit', 'target': 'projects', 'index': 0, 'item': {'title': 5}}, "'title' must be a string"),
+    ({'op': 'edit', 'target': 'projects', 'index': 0, 'item': {'technologies': [1]}}, "'technologies' must be a list"),
+    ({'op': 'edit', 'target': 'hero_buttons', 'index': 0, 'item': {'is_visible': 'yes'}}, "'is_visible' must be true or false"),
+])
+def test_invalid_operation_is_reported_with_its_index(op, error):
+    errors = validate_operations([ADD_SKILL, op])
+    assert len(errors) == 1
+    assert errors[0]['index'] == 1
+    assert errors[0]['error'].startswith(error)
+
+
+def test_every_invalid_operation_is_reported():
+    errors = validate_operations(['x', ADD_SKILL, {'op': 'add', 'target': 'nowhere'}])
+    assert [error['index'] for error in errors] == [0, 2]
+
+
+def test_apply_operations_in_order():
+    data = portfolio()
+    ops = [
+        ADD_SKILL,
+        {'op': 'reorder', 'target': 'skills', 'type': 'technical', 'order': [2, 0, 1]},
+        {'op': 'edit', 'target': 'skills', 'type': 'technical', 'index': 0, 'item': {'description': 'new'}},
+        {'op': 'delete', 'target': 'projects', 'index': 0},
+        {'op': 'add', 'target': 'projects', 'item': {'title': 'Two', 'description': 'd', 'technologies': 'a, ,b'}},
+        {'op': 'add', 'target': 'hero_buttons', 'item': {'text': 'Hi', 'link': '#', 'icon': '👋'}},
+        {'op': 'edit', 'target': 'contact', 'item': {'phone': '123'}},
+    ]
+    assert validate_operations(ops) == []
+    results = apply_operations(data, ops)
+    assert [result['index'] for result in results] == list(range(len(ops)))
+    assert results[0]['position'] == 2
+    assert data['skills']['technical'] == [{'name': 'Go', 'description': 'new'}, {'name': 'Python'}, {'name': 'SQL'}]
+    assert data['projects'] == [{'title': 'Two', 'description': 'd', 'technologies': ['a', 'b']}]
+    assert data['about']['hero_buttons'][0]['is_visible'] is True
+    assert data['contact'] == {'email': 'old@example.com', 'phone': '123'}
+
+
+@pytest.mark.parametrize('op, error', [
+    ({'op': 'edit', 'target': 'projects', 'index': 1, 'item': {'title': 'x'}}, 'No projects entry at index 1 (there are 1)'),
+    ({'op': 'delete', 'target': 'skills', 'type': 'soft', 'index': 0}, 'No skills entry at index 0 (there are 0)'),
+    ({'op': 'reorder', 'target': 'skills', 'type': 'technical', 'order': [0, 0]}, "'order' must list each index"),
+    ({'op': 'reorder', 'target': 'skills', 'type': 'technical', 'order': [0]}, "'order' must list each index"),
+])
+def test_apply_operations_raises_on_the_first_bad_operation(op, error):
+    data = portfolio()
+    ops = [ADD_SKILL, op, ADD_SKILL]
+    assert validate_operations(ops) == []
+    with pytest.raises(BatchError) as excinfo:
+        apply_operations(data, ops)
+    assert excinfo.value.index == 1
+    assert excinfo.value.message.startswith(error)
+
+
+def test_indexes_refer_to_the_list_after_earlier_operations():
+    data = portfolio()
+    ops = [{'op': 'delete', 'target': 'projects', 'index': 0},
+           {'op': 'delete', 'target': 'projects', 'index': 0}]
+    with pytest.raises(BatchError) as excinfo:
+        apply_operations(data, ops)
+    assert excinfo.value.index == 1
+
+
+def test_describe():
+    assert describe(ADD_SKILL) == 'type=technical, name=Go'
+    assert describe({'op': 'reorder', 'target': 'projects', 'order': [1, 0]}) == 'order=[1, 0]'
+    assert describe({'op': 'edit', 'target': 'contact', 'item': {'phone': '1'}}) == 'fields=phone'
@@ -0,0 +1,120 @@
+import glob
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from minify import extract_critical_css, minify_css, minify_js
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+NODE = shutil.which('node')
+
+
+def js_parses(tmp_path, source):
+    path = tmp_path / 'script.js'
+    path.write_text(source, encoding='utf-8')
+    return subprocess.run([NODE, '--check', str(path)], capture_output=True).returncode == 0
+
+
+def run_js(source):
+    return subprocess.run([NODE, '-e', source], capture_output=True, text=True, check=True).stdout
+
+
+# --- CSS ---
+
+def test_css_comments_and_whitespace_are_removed():
+    source = '/* header */\n.a ,\n.b > .c {\n  color : red ;\n  margin: 0 !important;\n}\n'
+    assert minify_css(source) == '.a,.b>.c{color:red;margin:0!important}\n'
+
+
+def test_css_strings_are_kept_verbatim():
+    source = '.a::before { content : " a : b ;  /* no comment */ " ; }'
+    assert minify_css(source) == '.a::before{content:" a : b ;  /* no comment */ "}\n'
+
+
+def test_css_descendant_pseudo_class_keeps_its_space():
+    assert minify_css('.menu :hover { color : red }') == '.menu :hover{color:red}\n'
+    assert minify_css('@media (min-width: 10px) { a :focus { outline : 0 } }') == \
+        '@media (min-width:10px){a :focus{outline:0}}\n'
+
+
+# --- JS ---
+
+def test_js_comments_and_indentation_are_removed():
+    source = 'function f(a, b) {\n    // sum\n    return a + b; /* done */\n}\n'
+    assert minify_js(source) == 'function f(a,b){\nreturn a+b;\n}\n'
+
+
+def test_js_keeps_spaces_that_separate_tokens():
+    assert minify_js('var x = a + +b - -c;') == 'var x=a+ +b- -c;\n'
+    assert minify_js('return typeof x;') == 'return typeof x;\n'
+
+
+@pytest.mark.parametrize('source, expected', [
+    ("var s = 'a // b /* c */';", "var s='a // b /* c */';"),
+    ('var t = `x ${ {a: 1}.a } // y`;', 'var t=`x ${{a:1}.a} // y`;'),
+    ('var r = /\\/\\/[/*]/g;', 'var r=/\\/\\/[/*]/g;'),
+    ('if (a) { b() }\n/x\\/y/.test(s);', 'if(a){b()}\n/x\\/y/.test(s);'),
+    ('function f() {} /[/]/g.exec(z);', 'function f(){}/[/]/g.exec(z);'),
+    ('return /x/.test(y);', 'return/x/.test(y);'),
+    ('var q = a / b / c;', 'var q=a/b/c;'),
+])
+def test_js_literals_survive(source, expected):
+    # Everything that only looks like a comment sits inside a literal
+    assert minify_js(source) == expected + '\n'
+
+
+@pytest.mark.skipif(NODE is None, reason='node is not installed')
+@pytest.mark.parametrize('source, expected', [
+    ('var s = "a // b";\nconsole.log(s)', 'a // b'),
+    ('var r = 6 / 2 / 3;\nconsole.log(r)', '1'),
+    ('if (true) { }\n/a\\/b/.test("a/b") && console.log("regex")', 'regex'),
+    ('var o = {a: 1}, x = `${ {b: 2}.b }/${o.a}`;\nconsole.log(x)', '2/1'),
+    ('var a = 1, b = 2\n++b\nconsole.log(a, b)', '1 3'),
+])
+def test_minified_js_behaves_the_same(source, expected):
+    assert run_js(minify_js(source)).strip() == run_js(source).strip() == expected
+
+
+@pytest.mark.skipif(NODE is None, reason='node is not installed')
+@pytest.mark.parametrize('path', [path for path in glob.glob(os.path.join(STATIC_DIR, 'js', '*.js'))
+                                  if not path.endswith('.min.js')])
+def test_minified_site_scripts_still_parse(tmp_path, path):
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    minified = minify_js(source)
+    assert len(minified) < len(source)
+    assert js_parses(tmp_path, minified)
+
+
+# --- Critical CSS ---
+
+CSS = minify_css('''
+:root { --accent: red }
+.hero { padding: 2rem; animation: fade 1s }
+.hero:hover, .hero .title { color: blue }
+.hero .title:focus { outline: 0 }
+.footer { margin: 0 }
+@media print { .hero { display: none } }
+@media (max-width: 600px) { .hero { padding: 1rem } .footer { padding: 0 } }
+@keyframes fade { from { opacity: 0 } to { opacity: 1 } }
+@keyframes unused { from { opacity: 0 } }
+''')
+HTML = '<html><body><section class="hero"><h1 class="title">Hi</h1></section>'
+
+
+def test_critical_css_keeps_only_rules_for_the_fragment():
+    critical = extract_critical_css(CSS, HTML)
+    assert critical == (':root{--accent:red}.hero{padding:2rem;animation:fade 1s}.hero .title{color:blue}'
+                        '@media (max-width:600px){.hero{padding:1rem}}'
+                        '@keyframes fade{from{opacity:0}to{opacity:1}}')
+
+
+def test_critical_css_respects_the_size_budget():
+    full = extract_critical_css(CSS, HTML)
+    for budget in (0, 20, 60, len(full) - 1):
+        critical = extract_critical_css(CSS, HTML, budget)
+        assert len(critical) <= budget
+    assert extract_critical_css(CSS, HTML, 60).startswith(':root{--accent:red}.hero{')
+    assert extract_critical_css(CSS, HTML, len(full)) == full
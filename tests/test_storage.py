@@ -0,0 +1,173 @@
+import copy
+import json
+
+import pytest
+
+import storage
+from storage import FORMATS, DocumentStore, SQLiteStore, decode_document, detect_format, encode_document, thaw
+
+DOCUMENT = {
+    'admin_credentials': {'username': 'admin', 'password_hash': 'pbkdf2:sha256:1$salt$hash'},
+    'settings': {'site_title': 'Portfolio – ünïcode', 'maintenance_mode': False},
+    'portfolios': [
+        {
+            'id': 'p1',
+            'name': 'Main',
+            'is_active': True,
+            'about': {'name': 'Ada', 'hero_buttons': [{'text': 'CV', 'link': '/cv.pdf', 'icon': '📄', 'is_visible': True}]},
+            'contact': {'email': 'ada@example.com'},
+            'skills': {'technical': [{'name': 'Python'}, {'name': 'SQL'}, {'name': 'Rust'}], 'soft': []},
+            'projects': [{'title': f'Project {i}', 'technologies': ['a', 'b'], 'stars': i} for i in range(5)],
+            'experience': {'internships': [], 'certifications': [{'title': 'Cert', 'year': '2023'}]},
+        },
+        {'id': 'p2', 'name': 'Second', 'is_active': False, 'projects': [], 'skills': {}},
+    ],
+}
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_encode_decode_round_trip(fmt):
+    raw = encode_document(DOCUMENT, fmt)
+    assert decode_document(raw) == DOCUMENT
+    assert detect_format(raw) == fmt
+
+
+def test_binary_without_msgpack_falls_back_to_zlib_json(monkeypatch):
+    monkeypatch.setattr(storage, 'msgpack', None)
+    raw = encode_document(DOCUMENT, 'binary')
+    assert raw[len(storage.BINARY_MAGIC):len(storage.BINARY_MAGIC) + 1] == b'Z'
+    assert decode_document(raw) == DOCUMENT
+
+
+def test_truncated_binary_is_rejected():
+    raw = encode_document(DOCUMENT, 'binary')
+    with pytest.raises(ValueError):
+        decode_document(raw[:-1])
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        encode_document(DOCUMENT, 'yaml')
+    with pytest.raises(ValueError):
+        DocumentStore(str(tmp_path / 'data.json'), 'yaml')
+
+
+@pytest.mark.parametrize('fmt', FORMATS)
+def test_document_store_round_trip(tmp_path, fmt):
+    path = str(tmp_path / 'data.json')
+    store = DocumentStore(path, fmt)
+    assert thaw(store.snapshot()) == {}
+    store.write(DOCUMENT)
+    assert thaw(store.snapshot()) == DOCUMENT
+    with open(path, 'rb') as f:
+        assert detect_format(f.read()) == fmt
+    # Another worker (a fresh store) reads whatever format is on disk
+    assert thaw(DocumentStore(path).snapshot()) == DOCUMENT
+
+
+def test_document_store_picks_up_external_writes(tmp_path):
+    path = tmp_path / 'data.json'
+    store = DocumentStore(str(path))
+    store.write(DOCUMENT)
+    version = store.version
+    changed = copy.deepcopy(DOCUMENT)
+    changed['settings']['site_title'] = 'Edited by hand'
+    path.write_text(json.dumps(changed, indent=2, ensure_ascii=False) + '\n', encoding='utf-8')
+    assert store.snapshot()['settings']['site_title'] == 'Edited by hand'
+    assert store.version > version
+
+
+def test_snapshot_is_read_only(tmp_path):
+    store = DocumentStore(str(tmp_path / 'data.json'))
+    store.write(DOCUMENT)
+    snapshot = store.snapshot()
+    with pytest.raises(TypeError):
+        snapshot['settings']['site_title'] = 'x'
+    with pytest.raises(TypeError):
+        snapshot['portfolios'].append({})
+    editable = store.load_copy()
+    editable['settings']['site_title'] = 'x'
+    assert store.snapshot()['settings']['site_title'] == DOCUMENT['settings']['site_title']
+
+
+@pytest.mark.parametrize('backend', ['json', 'sqlite'])
+def test_transaction_writes_back(tmp_path, backend):
+    json_path = tmp_path / 'data.json'
+    json_path.write_text(json.dumps(DOCUMENT), encoding='utf-8')
+    store = storage.open_store(backend, str(json_path))
+    with store.transaction() as data:
+        data['portfolios'][0]['projects'].append({'title': 'Added'})
+    reopened = storage.open_store(backend, str(json_path))
+    assert reopened.snapshot()['portfolios'][0]['projects'][-1]['title'] == 'Added'
+
+
+# --- SQLite backend ---
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    json_path = tmp_path / 'data.json'
+    json_path.write_text(json.dumps(DOCUMENT), encoding='utf-8')
+    return SQLiteStore(str(tmp_path / 'portfolio.db'), import_path=str(json_path))
+
+
+def row_writes(store, change):
+    """Apply change() to a copy of the document, write it, and return the row statements it took."""
+    statements = []
+    data = store.load_copy()
+    change(data)
+    store.db.connection().set_trace_callback(statements.append)
+    try:
+        store.write(data)
+    finally:
+        store.db.connection().set_trace_callback(None)
+    assert thaw(store.snapshot()) == data
+    assert thaw(SQLiteStore(store.db.path).snapshot()) == data
+    return [sql for sql in statements
+            if sql.split()[0] in ('INSERT', 'UPDATE', 'DELETE') and 'revision' not in sql]
+
+
+def test_sqlite_store_imports_json(sqlite_store):
+    assert thaw(sqlite_store.snapshot()) == DOCUMENT
+
+
+def test_sqlite_store_round_trip(sqlite_store):
+    changed = copy.deepcopy(DOCUMENT)
+    changed['portfolios'].reverse()
+    changed['portfolios'][0]['projects'] = [{'title': 'Only'}]
+    changed['settings'] = {'site_title': 'New'}
+    changed['new_key'] = [1, 2, {'nested': None}]
+    sqlite_store.write(changed)
+    assert thaw(sqlite_store.snapshot()) == changed
+    assert thaw(SQLiteStore(sqlite_store.db.path).snapshot()) == changed
+
+
+@pytest.mark.parametrize('change, expected', [
+    (lambda d: None, 0),
+    (lambda d: d['portfolios'][0]['projects'][2].update(title='Edited'), 1),
+    (lambda d: d['portfolios'][0]['projects'].insert(1, {'title': 'Inserted'}), 1),
+    (lambda d: d['portfolios'][0]['skills']['technical'].pop(0), 1),
+    (lambda d: d['settings'].update(site_title='Renamed'), 1),
+])
+def test_sqlite_store_writes_only_changed_rows(sqlite_store, change, expected):
+    assert len(row_writes(sqlite_store, change)) == expected
+
+
+def test_sqlite_store_survives_repeated_inserts_at_one_spot(sqlite_store):
+    # Positions between two neighbours eventually run out of precision
+    for i in range(80):
+        row_writes(sqlite_store, lambda d: d['portfolios'][0]['projects'].insert(1, {'title': f'x{i}'}))
+    titles = [project['title'] for project in sqlite_store.snapshot()['portfolios'][0]['projects']]
+    assert titles[1:81] == [f'x{i}' for i in reversed(range(80))]
+
+
+def test_sqlite_store_reorder_and_delete_portfolio(sqlite_store):
+    row_writes(sqlite_store, lambda d: d['portfolios'][0]['projects'].reverse())
+    row_writes(sqlite_store, lambda d: d['portfolios'].pop(0))
+    assert [p['id'] for p in sqlite_store.snapshot()['portfolios']] == ['p2']
+
+
+def test_sqlite_store_sees_other_writers(sqlite_store):
+    other = SQLiteStore(sqlite_store.db.path)
+    with other.transaction() as data:
+        data['settings']['site_title'] = 'From another worker'
+    assert sqlite_store.snapshot()['settings']['site_title'] == 'From another worker'
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+# Largest accepted file upload
+MAX_UPLOAD_SIZE = 2 * 1024 * 1024
+# Room for the other form fields and multipart boundaries on top of the file
+MAX_CONTENT_LENGTH = MAX_UPLOAD_SIZE + 64 * 1024
+# Leading bytes of each accepted image format -> file extension
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+SNIFF_BYTES = max(len(signature) for signature, _ in IMAGE_SIGNATURES)
+
+
+class UploadSpool:
+    """Temporary file that receives an uploaded file while the request is parsed.
+
+    Werkzeug writes the multipart body into it chunk by chunk, so uploads go
+    straight to disk. The running size is checked on every chunk and the
+    request is rejected with 413 as soon as it exceeds ``limit``. The content
+    hash and the leading bytes (for format sniffing) are taken on the way
+    through, so the file never has to be read back.
+    """
+
+    def __init__(self, limit=MAX_UPLOAD_SIZE):
+        self.limit = limit
+        self.size = 0
+        self.head = b''
+        self._digest = hashlib.sha256()
+        self._file = tempfile.TemporaryFile()
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise RequestEntityTooLarge()
+        if len(self.head) < SNIFF_BYTES:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+        self._digest.update(chunk)
+        return self._file.write(chunk)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+
+class UploadRequest(Request):
+    """Request class that spools uploaded files through UploadSpool."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool()
+
+
+def sniff_image(head):
+    """Return the extension matching an image's magic bytes, or None."""
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+
+def store_upload(spool, directory, extension):
+    """
+    Move a spooled upload into directory under a name derived from its content hash.
+
+    Identical uploads map to the same file, so re-uploading an image reuses
+    the existing copy instead of adding another one.
+
+    Returns:
+        tuple: (filename, whether a new file was written)
+    """
+    filename = f"{spool.hexdigest()[:16]}.{extension}"
+    path = os.path.join(directory, filename)
+    if os.path.exists(path) and os.path.getsize(path) == spool.size:
+        return filename, False
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{filename}.{os.getpid()}.tmp")
+    spool.seek(0)
+    with open(tmp_path, 'wb') as f:
+        shutil.copyfileobj(spool, f)
+    os.replace(tmp_path, path)
+    return filename, True